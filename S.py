@@ -1,21 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import threading
-import requests
+from engine import Download
+from scheduler import DownloadScheduler
+from store import QueueStore, default_path
 import os
 
 # مسیر پیش‌فرض برای ذخیره فایل‌ها
 download_directory = os.path.abspath("downloads")
+REFRESH_MS = 250
+# صف ذخیره‌شده دسته‌دسته بین تیک‌های رابط کاربری ساخته می‌شود؛ هر ردیف چند ویجت دارد پس دسته‌ها کوچک‌اند
+RESTORE_BATCH = 50
+RESTORE_BATCH_MS = 10
 
-# کلاس مدیریت دانلود یک فایل
+# نمایش یک دانلود؛ خود دانلود در engine.Download است
 class DownloadItem:
-    def __init__(self, url, frame, row):
-        self.url = url
-        self.local_filename = url.split("/")[-1]
-        self.filepath = os.path.join(download_directory, self.local_filename)
-        self.is_paused = False
-        self.is_downloading = False
-        self.thread = None
+    def __init__(self, url, frame, row, task=None):
+        self.task = task or Download(url, download_directory)
+        self.local_filename = self.task.local_filename
+        self.shown_status = self.task.status_text
 
         # رابط گرافیکی
         self.label = tk.Label(frame, text=self.local_filename[:40] + "...")
@@ -29,62 +31,22 @@ class DownloadItem:
         self.button.grid(row=row, column=3)
 
     def toggle_pause(self):
-        if not self.is_downloading:
-            return
-        self.is_paused = not self.is_paused
-        self.button.config(text="▶️ Resume" if self.is_paused else "⏸ Pause")
-        self.status.config(text="⏸ متوقف شده" if self.is_paused else "⬇️ ادامه دانلود")
+        self.task.toggle_pause()
+        self.button.config(text="▶️ Resume" if self.task.is_paused else "⏸ Pause")
 
     def update_progress(self, percent):
         self.progress["value"] = percent
 
-    def update_status(self, text):
-        self.status.config(text=text)
-
-    def start(self):
-        self.thread = threading.Thread(target=self.download)
-        self.thread.start()
-
-    def download(self):
-        global download_directory
-        os.makedirs(download_directory, exist_ok=True)
-        self.filepath = os.path.join(download_directory, self.local_filename)
-
-        resume_header = {}
-        mode = "wb"
-
-        if os.path.exists(self.filepath):
-            downloaded_bytes = os.path.getsize(self.filepath)
-            resume_header = {"Range": f"bytes={downloaded_bytes}-"}
-            mode = "ab"
-        else:
-            downloaded_bytes = 0
-
-        try:
-            with requests.get(self.url, stream=True, headers=resume_header) as r:
-                if r.status_code not in (200, 206):
-                    self.update_status(f"❌ HTTP {r.status_code}")
-                    return
-
-                total_size = int(r.headers.get("Content-Length", 0)) + downloaded_bytes
-                downloaded = downloaded_bytes
-                self.is_downloading = True
-
-                with open(self.filepath, mode) as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        while self.is_paused:
-                            if not self.is_downloading:
-                                return
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            percent = downloaded / total_size * 100
-                            self.update_progress(percent)
-                self.update_status("✅ کامل شد")
-            self.is_downloading = False
-        except Exception as e:
-            self.update_status(f"❌ خطا: {str(e)}")
-            self.is_downloading = False
+    def refresh_view(self):
+        task = self.task
+        if task.status_text != self.shown_status:
+            self.status.config(text=task.status_text)
+            self.shown_status = task.status_text
+        if task.filesize:
+            self.update_progress(task.meter.total() / task.filesize * 100)
+
+    def needs_refresh(self):
+        return self.task.is_downloading or self.task.status_text != self.shown_status
 
 # رابط گرافیکی
 root = tk.Tk()
@@ -114,13 +76,25 @@ def add_to_queue():
         return
     row = len(download_items)
     item = DownloadItem(url, list_frame, row)
+    store.add(item.task)
     download_items.append(item)
     url_entry.delete(0, tk.END)
 
 def start_all_downloads():
+    global started_all
+    # ردیف‌هایی که بعدا از صف ذخیره‌شده بارگذاری می‌شوند هم شروع می‌شوند
+    started_all = True
     for item in download_items:
-        if not item.is_downloading:
-            item.start()
+        start_task(item.task)
+
+def start_task(task):
+    if not task.is_downloading and not task.is_queued and not task.completed:
+        task.is_queued = True
+        # پوشه‌ی ذخیره موقع شروع خوانده می‌شود، نه موقع افزودن
+        task.set_dest_dir(download_directory)
+        task.update_status("در صف")
+        store.watch(task)
+        scheduler.submit(task)
 
 tk.Button(top_frame, text="➕ افزودن به صف", command=add_to_queue).pack(side="left", padx=5)
 tk.Button(root, text="▶️ شروع همه دانلودها", command=start_all_downloads).pack(pady=10)
@@ -139,6 +113,40 @@ list_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
 # لیست دانلودها
 download_items = []
+started_all = False
+scheduler = DownloadScheduler()
+
+# صف ذخیره‌شده‌ی اجرای قبل؛ با «شروع همه» ادامه پیدا می‌کند
+store = QueueStore(default_path(__file__))
+restoring = store.load(RESTORE_BATCH)
+
+def restore_batch():
+    # دسته‌ی اول همین حالا، بقیه بعد از نمایش پنجره
+    tasks = next(restoring, None)
+    if tasks is None:
+        return
+    for task in tasks:
+        download_items.append(DownloadItem(task.url, list_frame, len(download_items), task))
+        if started_all:
+            start_task(task)
+    root.after(RESTORE_BATCH_MS, restore_batch)
+
+restore_batch()
+
+def on_close():
+    store.close()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", on_close)
+
+# نمایش پیشرفت با نرخ ثابت، از Thread رابط کاربری
+def refresh_items():
+    for item in download_items:
+        if item.needs_refresh():
+            item.refresh_view()
+    root.after(REFRESH_MS, refresh_items)
+
+root.after(REFRESH_MS, refresh_items)
 
 # شروع رابط
 root.mainloop()
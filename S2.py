@@ -1,6 +1,7 @@
 import customtkinter as ctk
-import threading
-import requests
+from engine import Download
+from scheduler import DownloadScheduler
+from store import QueueStore, default_path
 import os
 
 # تنظیم حالت تاریک و تم
@@ -8,16 +9,17 @@ ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
 
 download_directory = os.path.abspath("downloads")
+REFRESH_MS = 250
+# صف ذخیره‌شده دسته‌دسته بین تیک‌های رابط کاربری ساخته می‌شود؛ هر ردیف چند ویجت دارد پس دسته‌ها کوچک‌اند
+RESTORE_BATCH = 50
+RESTORE_BATCH_MS = 10
 
 class DownloadItem(ctk.CTkFrame):
-    def __init__(self, master, url, **kwargs):
+    def __init__(self, master, url, task=None, **kwargs):
         super().__init__(master, corner_radius=15, **kwargs)
-        self.url = url
-        self.local_filename = url.split("/")[-1]
-        self.filepath = os.path.join(download_directory, self.local_filename)
-        self.is_paused = False
-        self.is_downloading = False
-        self.thread = None
+        self.task = task or Download(url, download_directory)
+        self.local_filename = self.task.local_filename
+        self.shown_status = self.task.status_text
 
         self.grid_columnconfigure(1, weight=1)
 
@@ -33,59 +35,22 @@ class DownloadItem(ctk.CTkFrame):
         self.button.grid(row=0, column=3, padx=10, pady=10)
 
     def toggle_pause(self):
-        if not self.is_downloading:
-            return
-        self.is_paused = not self.is_paused
-        self.button.configure(text="▶️ Resume" if self.is_paused else "⏸ Pause")
-        self.status.configure(text="⏸ متوقف شده" if self.is_paused else "⬇️ ادامه دانلود")
+        self.task.toggle_pause()
+        self.button.configure(text="▶️ Resume" if self.task.is_paused else "⏸ Pause")
 
     def update_progress(self, percent):
         self.progress.set(percent / 100)
 
-    def update_status(self, text):
-        self.status.configure(text=text)
-
-    def start(self):
-        self.thread = threading.Thread(target=self.download)
-        self.thread.start()
-
-    def download(self):
-        os.makedirs(download_directory, exist_ok=True)
-        resume_header = {}
-        mode = "wb"
-
-        if os.path.exists(self.filepath):
-            downloaded_bytes = os.path.getsize(self.filepath)
-            resume_header = {"Range": f"bytes={downloaded_bytes}-"}
-            mode = "ab"
-        else:
-            downloaded_bytes = 0
-
-        try:
-            with requests.get(self.url, stream=True, headers=resume_header) as r:
-                if r.status_code not in (200, 206):
-                    self.update_status(f"❌ HTTP {r.status_code}")
-                    return
-
-                total_size = int(r.headers.get("Content-Length", 0)) + downloaded_bytes
-                downloaded = downloaded_bytes
-                self.is_downloading = True
-
-                with open(self.filepath, mode) as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        while self.is_paused:
-                            if not self.is_downloading:
-                                return
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            percent = downloaded / total_size * 100
-                            self.update_progress(percent)
-                self.update_status("✅ کامل شد")
-            self.is_downloading = False
-        except Exception as e:
-            self.update_status(f"❌ خطا: {str(e)}")
-            self.is_downloading = False
+    def refresh_view(self):
+        task = self.task
+        if task.status_text != self.shown_status:
+            self.status.configure(text=task.status_text)
+            self.shown_status = task.status_text
+        if task.filesize:
+            self.update_progress(task.meter.total() / task.filesize * 100)
+
+    def needs_refresh(self):
+        return self.task.is_downloading or self.task.status_text != self.shown_status
 
 class IDMApp(ctk.CTk):
     def __init__(self):
@@ -96,6 +61,11 @@ class IDMApp(ctk.CTk):
         self.minsize(700, 400)
 
         self.download_items = []
+        # «شروع همه» زده شده؛ ردیف‌هایی که بعدا بارگذاری می‌شوند هم شروع می‌شوند
+        self.started_all = False
+        self.scheduler = DownloadScheduler()
+        self.store = QueueStore(default_path(__file__))
+        self.restoring = self.store.load(RESTORE_BATCH)
 
         # ورودی لینک و دکمه ها
         self.top_frame = ctk.CTkFrame(self, corner_radius=15)
@@ -124,6 +94,31 @@ class IDMApp(ctk.CTk):
         self.list_frame = ctk.CTkScrollableFrame(self, corner_radius=15)
         self.list_frame.pack(padx=20, pady=15, fill="both", expand=True)
 
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.restore_batch()
+        self.after(REFRESH_MS, self.refresh_items)
+
+    def restore_batch(self):
+        # دسته‌ی اول همین حالا، بقیه بعد از نمایش پنجره
+        tasks = next(self.restoring, None)
+        if tasks is None:
+            return
+        for task in tasks:
+            self.add_item(DownloadItem(self.list_frame, task.url, task))
+            if self.started_all:
+                self.start_task(task)
+        self.after(RESTORE_BATCH_MS, self.restore_batch)
+
+    def on_close(self):
+        self.store.close()
+        self.destroy()
+
+    def refresh_items(self):
+        for item in self.download_items:
+            if item.needs_refresh():
+                item.refresh_view()
+        self.after(REFRESH_MS, self.refresh_items)
+
     def choose_download_folder(self):
         from tkinter import filedialog
         global download_directory
@@ -138,14 +133,27 @@ class IDMApp(ctk.CTk):
             ctk.CTkMessageBox(title="خطا", message="لینک را وارد کنید.")
             return
         item = DownloadItem(self.list_frame, url)
+        self.store.add(item.task)
+        self.add_item(item)
+        self.url_entry.delete(0, "end")
+
+    def add_item(self, item):
         item.pack(pady=5, fill="x", padx=10)
         self.download_items.append(item)
-        self.url_entry.delete(0, "end")
 
     def start_all_downloads(self):
+        self.started_all = True
         for item in self.download_items:
-            if not item.is_downloading:
-                item.start()
+            self.start_task(item.task)
+
+    def start_task(self, task):
+        if not task.is_downloading and not task.is_queued and not task.completed:
+            task.is_queued = True
+            # پوشه‌ی ذخیره موقع شروع خوانده می‌شود، نه موقع افزودن
+            task.set_dest_dir(download_directory)
+            task.update_status("در صف")
+            self.store.watch(task)
+            self.scheduler.submit(task)
 
 if __name__ == "__main__":
     app = IDMApp()
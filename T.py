@@ -1,37 +1,192 @@
-import os
-import requests
+import argparse
+import sys
+import time
+
+import metrics
+from engine import Download
+from progress import sizeof_fmt
+from ratelimit import set_global_limit
+from scheduler import DownloadScheduler, MAX_ACTIVE_DOWNLOADS, MAX_DOWNLOADS_PER_HOST, POLICIES
+
+# نمایش با نرخ ثابت به‌روز می‌شود، نه به ازای هر chunk
+REFRESH_SECONDS = 0.5
+# بعد از Ctrl+C این‌قدر صبر می‌کنیم تا Workerها ژورنال ادامه را بنویسند
+SHUTDOWN_TIMEOUT = 10.0
+# فایل --metrics هر این‌قدر بازنویسی می‌شود
+METRICS_SECONDS = 5.0
+BAR_WIDTH = 30
+NAME_WIDTH = 32
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
 
 def download_file(url, dest_folder="downloads"):
-    os.makedirs(dest_folder, exist_ok=True)
-    local_filename = url.split("/")[-1]
-    filepath = os.path.join(dest_folder, local_filename)
-
-    resume_header = {}
-    mode = "wb"
-
-    if os.path.exists(filepath):
-        downloaded_bytes = os.path.getsize(filepath)
-        resume_header = {"Range": f"bytes={downloaded_bytes}-"}
-        mode = "ab"
-    else:
-        downloaded_bytes = 0
-
-    with requests.get(url, stream=True, headers=resume_header) as r:
-        if r.status_code in (200, 206):
-            total_size = int(r.headers.get("Content-Length", 0)) + downloaded_bytes
-            print(f"Downloading: {local_filename} | Size: {total_size / 1024:.2f} KB")
-
-            with open(filepath, mode) as f:
-                downloaded = downloaded_bytes
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        done = int(50 * downloaded / total_size)
-                        print(f"\r[{'█' * done}{'.' * (50 - done)}] {downloaded / 1024:.2f} KB", end="")
-            print("\nDownload complete.")
+    task = Download(url, dest_folder)
+    task.run_download()
+    return task.completed
+
+
+def parse_line(line):
+    # "URL [MIRROR ...] [checksum=SPEC]"؛ خط خالی و توضیح با # نادیده گرفته می‌شود
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    urls, checksum = [], None
+    for word in line.split():
+        if word.startswith("checksum="):
+            checksum = word[len("checksum="):]
+        else:
+            urls.append(word)
+    return (urls, checksum) if urls else None
+
+
+def read_jobs(sources):
+    # هر source یک لینک، یک فایل فهرست یا "-" برای stdin است
+    jobs = []
+    for source in sources:
+        if source.startswith(("http://", "https://")):
+            lines = [source]
+        elif source == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(source, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        for line in lines:
+            job = parse_line(line)
+            if job:
+                jobs.append(job)
+    return jobs
+
+
+class ProgressView:
+    def __init__(self, tasks, stream):
+        self.tasks = tasks
+        self.stream = stream
+        # روی ترمینال یک بلوک چندخطی بازنویسی می‌شود؛ در cron یا فایل فقط نتیجه‌ها چاپ می‌شوند
+        self.live = stream.isatty()
+        self.reported = set()
+        self.drawn = 0
+
+    def result_line(self, task):
+        if task.completed:
+            return f"OK    {task.local_filename} ({sizeof_fmt(task.filesize)})"
+        return f"FAIL  {task.local_filename}: {task.status_text}"
+
+    def progress_line(self, task, downloaded, speed):
+        name = task.local_filename[:NAME_WIDTH].ljust(NAME_WIDTH)
+        if task.filesize > 0:
+            fraction = min(downloaded / task.filesize, 1.0)
+            done = int(BAR_WIDTH * fraction)
+            bar = f"[{'█' * done}{'.' * (BAR_WIDTH - done)}] {fraction * 100:5.1f}%"
         else:
-            print("Failed to download. HTTP Status:", r.status_code)
+            bar = f"[{' ' * BAR_WIDTH}] {sizeof_fmt(downloaded)}"
+        return f"{name} {bar} {sizeof_fmt(speed):>9}/s"
+
+    def draw(self):
+        results = []
+        for task in self.tasks:
+            if task.done.is_set() and id(task) not in self.reported:
+                self.reported.add(id(task))
+                results.append(self.result_line(task))
+        if not self.live:
+            if results:
+                self.stream.write("".join(line + "\n" for line in results))
+                self.stream.flush()
+            return
+
+        progress = []
+        total_speed = 0.0
+        for task in self.tasks:
+            if task.is_downloading:
+                downloaded, speed = task.meter.snapshot()
+                total_speed += speed
+                progress.append(self.progress_line(task, downloaded, speed))
+        progress.append(self.summary(total_speed))
+
+        # نتیجه‌ها بالای بلوک می‌مانند؛ فقط خطوط پیشرفت و خلاصه دوباره نوشته می‌شوند
+        out = f"\x1b[{self.drawn}F" if self.drawn else ""
+        out += "".join(f"\x1b[2K{line}\n" for line in results + progress) + "\x1b[J"
+        self.stream.write(out)
+        self.stream.flush()
+        self.drawn = len(progress)
+
+    def summary(self, speed=0.0):
+        total = len(self.tasks)
+        ok = sum(1 for t in self.tasks if t.completed)
+        failed = sum(1 for t in self.tasks if t.done.is_set() and not t.completed)
+        return f"{ok}/{total} done, {failed} failed, {sizeof_fmt(speed)}/s"
+
+
+def write_metrics(path):
+    try:
+        metrics.registry.write(path)
+    except OSError as e:
+        print(f"warning: cannot write metrics: {e}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Python IDM - batch download from the command line")
+    parser.add_argument("sources", nargs="*", default=["-"],
+                        help="URLs, files with one 'URL [MIRROR ...] [checksum=SPEC]' per line, or - for stdin")
+    parser.add_argument("-d", "--dir", default="downloads")
+    parser.add_argument("-j", "--jobs", type=int, default=MAX_ACTIVE_DOWNLOADS)
+    parser.add_argument("--per-host", type=int, default=MAX_DOWNLOADS_PER_HOST)
+    parser.add_argument("--policy", choices=POLICIES, default="fifo")
+    parser.add_argument("--limit", type=float, default=0, help="global speed limit in KB/s")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write engine metrics here while running (.json snapshot, otherwise Prometheus text)")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = read_jobs(args.sources)
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if not jobs:
+        print("error: no URLs given", file=sys.stderr)
+        return EXIT_USAGE
+
+    set_global_limit(int(args.limit * 1024))
+    scheduler = DownloadScheduler(args.jobs, args.per_host, args.policy)
+    tasks = [Download(urls, args.dir, checksum) for urls, checksum in jobs]
+    view = ProgressView(tasks, sys.stderr)
+    for task in tasks:
+        scheduler.submit(task)
+
+    next_metrics = 0.0
+    try:
+        while not all(task.done.is_set() for task in tasks):
+            view.draw()
+            if args.metrics and time.monotonic() >= next_metrics:
+                write_metrics(args.metrics)
+                next_metrics = time.monotonic() + METRICS_SECONDS
+            # با پایان دانلود زودتر بیدار می‌شویم، نه سر تیک بعدی
+            waiting = next((task for task in tasks if not task.done.is_set()), None)
+            if waiting is not None:
+                waiting.done.wait(REFRESH_SECONDS)
+    except KeyboardInterrupt:
+        for task in tasks:
+            scheduler.remove(task)
+            task.cancel()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for task in tasks:
+            if task.is_downloading:
+                task.done.wait(max(0.0, deadline - time.monotonic()))
+        view.draw()
+        if args.metrics:
+            write_metrics(args.metrics)
+        print("interrupted; run again to resume", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    view.draw()
+    if args.metrics:
+        write_metrics(args.metrics)
+    if not view.live:
+        print(view.summary(), file=sys.stderr)
+    return EXIT_FAILED if any(not task.completed for task in tasks) else EXIT_OK
+
 
-# مثال:
-download_file("https://speed.hetzner.de/100MB.bin")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import threading
-import os
-import requests
+from engine import Download
 
-def download_file(url, progress_callback, status_callback):
-    dest_folder = "downloads"
-    os.makedirs(dest_folder, exist_ok=True)
-    local_filename = url.split("/")[-1]
-    filepath = os.path.join(dest_folder, local_filename)
-
-    resume_header = {}
-    mode = "wb"
-
-    if os.path.exists(filepath):
-        downloaded_bytes = os.path.getsize(filepath)
-        resume_header = {"Range": f"bytes={downloaded_bytes}-"}
-        mode = "ab"
-    else:
-        downloaded_bytes = 0
-
-    try:
-        with requests.get(url, stream=True, headers=resume_header) as r:
-            if r.status_code in (200, 206):
-                total_size = int(r.headers.get("Content-Length", 0)) + downloaded_bytes
-                downloaded = downloaded_bytes
-
-                with open(filepath, mode) as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            percent = downloaded / total_size * 100
-                            progress_callback(percent)
-                status_callback("✅ دانلود کامل شد.")
-            else:
-                status_callback(f"❌ خطا: HTTP {r.status_code}")
-    except Exception as e:
-        status_callback(f"❌ خطا: {str(e)}")
+REFRESH_MS = 250
 
 def start_download():
     url = url_entry.get()
@@ -48,11 +13,22 @@ def start_download():
     download_button.config(state="disabled")
     status_label.config(text="⏳ در حال دانلود...")
 
-    def run():
-        download_file(url, update_progress, update_status)
-        download_button.config(state="normal")
+    task = Download(url, "downloads")
+    task.start()
+    root.after(REFRESH_MS, watch, task)
 
-    threading.Thread(target=run).start()
+def watch(task):
+    # دانلود در engine.Download است؛ اینجا فقط با نرخ ثابت وضعیتش را نشان می‌دهیم
+    if task.filesize:
+        update_progress(task.meter.total() / task.filesize * 100)
+    if not task.done.is_set():
+        root.after(REFRESH_MS, watch, task)
+        return
+    if task.completed:
+        update_status("✅ دانلود کامل شد.")
+    else:
+        update_status(task.status_text)
+    download_button.config(state="normal")
 
 def update_progress(percent):
     progress_bar["value"] = percent
@@ -1,73 +1,39 @@
 import customtkinter as ctk
-import threading
-import requests
 import os
-import time
-import math
-from tkinter import messagebox, filedialog
+import queue
+from engine import Download
+from listview import VirtualList, ROW_HEIGHT
+from probe import prober
+from scheduler import DownloadScheduler
+from search import SearchIndex
+from store import QueueStore, default_path
+from progress import sizeof_fmt
+from ratelimit import set_global_limit
+from tkinter import messagebox, filedialog, TclError
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
 
 download_directory = os.path.abspath("downloads")
-MAX_THREADS_PER_DOWNLOAD = 4
-
-def sizeof_fmt(num, suffix="B"):
-    for unit in ["", "K", "M", "G", "T", "P"]:
-        if abs(num) < 1024.0:
-            return f"{num:3.1f}{unit}{suffix}"
-        num /= 1024.0
-    return f"{num:.1f}Y{suffix}"
-
-class DownloadWorker(threading.Thread):
-    def __init__(self, url, start, end, filepath, parent_item, idx):
-        super().__init__()
-        self.url = url
-        self.start = start
-        self.end = end
-        self.filepath = filepath
-        self.parent_item = parent_item
-        self.idx = idx
-        self.daemon = True
-
-    def run(self):
-        headers = {"Range": f"bytes={self.start}-{self.end}"}
-        try:
-            with requests.get(self.url, headers=headers, stream=True, timeout=10) as r:
-                if r.status_code not in (206, 200):
-                    self.parent_item.update_status(f"\u274c HTTP {r.status_code} Error")
-                    return
-                with open(self.filepath, "r+b") as f:
-                    f.seek(self.start)
-                    for chunk in r.iter_content(chunk_size=8192):
-                        while self.parent_item.is_paused or self.parent_item.is_cancelled:
-                            if self.parent_item.is_cancelled:
-                                return
-                            time.sleep(0.1)
-                        if chunk:
-                            f.write(chunk)
-                            self.parent_item.update_downloaded(len(chunk))
-        except Exception as e:
-            self.parent_item.update_status(f"\u274c Error: {str(e)}")
-            self.parent_item.is_downloading = False
-
-class DownloadItem(ctk.CTkFrame):
-    def __init__(self, master, url, **kwargs):
-        super().__init__(master, corner_radius=15, **kwargs)
-        self.url = url
-        self.local_filename = url.split("/")[-1].split("?")[0]
-        self.filepath = os.path.join(download_directory, self.local_filename)
-        self.filesize = 0
-        self.downloaded_bytes = 0
-        self.is_paused = False
-        self.is_cancelled = False
-        self.is_downloading = False
-        self.workers = []
-        self.start_time = None
-
+REFRESH_MS = 250
+SEARCH_DELAY_MS = 150
+STATUS_REFRESH_TICKS = 4
+STATUS_LABELS = {"همه": "all", "در حال دانلود": "active", "در صف": "queued",
+                 "کامل شده": "completed", "خطا": "failed", "لغو شده": "cancelled"}
+ALL_HOSTS = "همه‌ی میزبان‌ها"
+LOAD_BATCH_MS = 10
+
+class DownloadRow(ctk.CTkFrame):
+    def __init__(self, master, **kwargs):
+        super().__init__(master, corner_radius=15, height=ROW_HEIGHT, **kwargs)
+        self.task = None
+        self.shown_status = None
+        self.shown_buttons = None
+
+        self.grid_propagate(False)
         self.grid_columnconfigure(1, weight=1)
 
-        self.label = ctk.CTkLabel(self, text=self.local_filename[:40]+"...", width=250)
+        self.label = ctk.CTkLabel(self, text="", width=250)
         self.progress = ctk.CTkProgressBar(self)
         self.progress.set(0)
         self.status = ctk.CTkLabel(self, text="در انتظار", width=150)
@@ -84,47 +50,57 @@ class DownloadItem(ctk.CTkFrame):
         self.pause_button.grid(row=1, column=2, padx=10)
         self.cancel_button.grid(row=1, column=3, padx=10)
 
-    def toggle_pause(self):
-        if not self.is_downloading:
-            return
-        self.is_paused = not self.is_paused
-        self.pause_button.configure(text="▶️ ادامه" if self.is_paused else "⏸ توقف")
-        self.update_status("⏸ متوقف شده" if self.is_paused else "⬇️ در حال دانلود")
-
-    def cancel(self):
-        if not self.is_downloading:
+    def attach(self, task):
+        if task is self.task:
             return
-        self.is_cancelled = True
-        self.update_status("لغو شد")
-        self.progress.set(0)
+        self.task = task
+        self.shown_status = None
+        self.shown_buttons = None
+        self.label.configure(text=task.local_filename[:40]+"...")
         self.speed_label.configure(text="سرعت: 0 KB/s")
         self.time_label.configure(text="زمان باقیمانده: --:--")
-        self.pause_button.configure(state="disabled")
-        self.cancel_button.configure(state="disabled")
-
-    def update_progress(self, percent):
-        self.progress.set(percent / 100)
+        self.refresh()
 
-    def update_status(self, text):
-        self.status.configure(text=text)
+    def toggle_pause(self):
+        self.task.toggle_pause()
+        self.refresh()
 
-    def update_downloaded(self, chunk_size):
-        self.downloaded_bytes += chunk_size
-        elapsed = time.time() - self.start_time
-        if elapsed > 0:
-            speed = self.downloaded_bytes / elapsed
-            speed_text = sizeof_fmt(speed) + "/s"
-        else:
-            speed = 0
-            speed_text = "0 KB/s"
+    def cancel(self):
+        if self.task.cancel():
+            self.refresh()
 
-        self.speed_label.configure(text=f"سرعت: {speed_text}")
+    def update_progress(self, percent):
+        self.progress.set(percent / 100)
 
-        if self.filesize > 0:
-            percent = self.downloaded_bytes / self.filesize * 100
-            self.update_progress(percent)
+    def refresh(self):
+        task = self.task
+        if task.status_text != self.shown_status:
+            self.status.configure(text=task.status_text)
+            self.shown_status = task.status_text
+
+        buttons = (task.is_paused, task.completed or task.is_cancelled)
+        if buttons != self.shown_buttons:
+            self.shown_buttons = buttons
+            self.pause_button.configure(text="▶️ ادامه" if task.is_paused else "⏸ توقف")
+            state = "disabled" if buttons[1] else "normal"
+            self.pause_button.configure(state=state)
+            self.cancel_button.configure(state=state)
+
+        if task.completed:
+            self.update_progress(100)
+            return
+        if not task.is_downloading or task.is_cancelled:
+            fraction = task.downloaded_bytes / task.filesize if task.filesize and not task.is_cancelled else 0
+            self.progress.set(fraction)
+            self.speed_label.configure(text="سرعت: 0 KB/s")
+            self.time_label.configure(text="زمان باقیمانده: --:--")
+            return
 
-            remaining = self.filesize - self.downloaded_bytes
+        downloaded, speed = task.meter.snapshot()
+        self.speed_label.configure(text=f"سرعت: {sizeof_fmt(speed)}/s")
+        if task.filesize > 0:
+            self.update_progress(downloaded / task.filesize * 100)
+            remaining = task.filesize - downloaded
             if speed > 0:
                 time_left = remaining / speed
                 mins = int(time_left // 60)
@@ -133,79 +109,6 @@ class DownloadItem(ctk.CTkFrame):
             else:
                 self.time_label.configure(text="زمان باقیمانده: --:--")
 
-        if self.downloaded_bytes >= self.filesize:
-            self.update_status("✅ کامل شد")
-            self.pause_button.configure(state="disabled")
-            self.cancel_button.configure(state="disabled")
-            self.is_downloading = False
-            messagebox.showinfo("دانلود کامل شد", f"دانلود فایل '{self.local_filename}' به پایان رسید.")
-
-    def start(self):
-        threading.Thread(target=self.download, daemon=True).start()
-
-    def download(self):
-        os.makedirs(download_directory, exist_ok=True)
-        self.is_paused = False
-        self.is_cancelled = False
-        self.is_downloading = True
-        self.downloaded_bytes = 0
-        self.start_time = time.time()
-
-        try:
-            r = requests.head(self.url, allow_redirects=True)
-            self.filesize = int(r.headers.get("Content-Length", 0))
-            accept_ranges = r.headers.get("Accept-Ranges", "none")
-            if accept_ranges != "bytes" or self.filesize == 0:
-                self.download_single_thread()
-            else:
-                self.download_multi_thread()
-        except Exception as e:
-            self.update_status(f"\u274c Error: {str(e)}")
-            self.is_downloading = False
-
-    def download_single_thread(self):
-        try:
-            with requests.get(self.url, stream=True) as r:
-                if r.status_code != 200:
-                    self.update_status(f"\u274c HTTP {r.status_code} Error")
-                    return
-                with open(self.filepath, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        while self.is_paused or self.is_cancelled:
-                            if self.is_cancelled:
-                                return
-                            time.sleep(0.1)
-                        if chunk:
-                            f.write(chunk)
-                            self.update_downloaded(len(chunk))
-            self.update_status("\u2705 کامل شد")
-            self.is_downloading = False
-        except Exception as e:
-            self.update_status(f"\u274c Error: {str(e)}")
-            self.is_downloading = False
-
-    def download_multi_thread(self):
-        with open(self.filepath, "wb") as f:
-            f.truncate(self.filesize)
-
-        part_size = math.ceil(self.filesize / MAX_THREADS_PER_DOWNLOAD)
-        self.workers.clear()
-
-        for i in range(MAX_THREADS_PER_DOWNLOAD):
-            start = i * part_size
-            end = min(start + part_size - 1, self.filesize - 1)
-            worker = DownloadWorker(self.url, start, end, self.filepath, self, i)
-            self.workers.append(worker)
-            worker.start()
-
-        for w in self.workers:
-            w.join()
-
-        if not self.is_cancelled:
-            self.update_status("\u2705 کامل شد")
-            self.is_downloading = False
-            messagebox.showinfo("دانلود کامل شد", f"دانلود فایل '{self.local_filename}' به پایان رسید.")
-
 class IDMApp(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -214,30 +117,96 @@ class IDMApp(ctk.CTk):
         self.geometry("900x600")
         self.minsize(700, 400)
 
-        self.download_items = []
+        self.tasks = []
+        self.shown_tasks = self.tasks
+        self.index = SearchIndex()
+        self.filter_job = None
+        self.ticks = 0
+        self.finished = queue.SimpleQueue()
+        self.scheduler = DownloadScheduler(on_done=self.finished.put)
+        self.store = QueueStore(default_path(__file__))
+        self.restoring = self.store.load()
 
         self.top_frame = ctk.CTkFrame(self, corner_radius=15)
         self.top_frame.pack(padx=20, pady=15, fill="x")
 
-        self.url_entry = ctk.CTkEntry(self.top_frame, placeholder_text="لینک دانلود را وارد کنید...", corner_radius=10)
+        self.url_entry = ctk.CTkEntry(self.top_frame, placeholder_text="لینک دانلود را وارد کنید (چند Mirror با فاصله)...", corner_radius=10)
         self.url_entry.pack(side="left", padx=10, pady=10, fill="x", expand=True)
 
+        self.checksum_entry = ctk.CTkEntry(self.top_frame, placeholder_text="هش یا لینک checksum (اختیاری)", width=200, corner_radius=10)
+        self.checksum_entry.pack(side="left", padx=5)
+
         self.add_button = ctk.CTkButton(self.top_frame, text="➕ افزودن به صف", command=self.add_to_queue, corner_radius=10)
         self.add_button.pack(side="left", padx=5)
 
+        self.paste_button = ctk.CTkButton(self.top_frame, text="📋 افزودن از کلیپ‌بورد", command=self.import_clipboard, corner_radius=10)
+        self.paste_button.pack(side="left", padx=5)
+
         self.select_dir_button = ctk.CTkButton(self.top_frame, text="📁 انتخاب پوشه دانلود", command=self.select_folder, corner_radius=10)
         self.select_dir_button.pack(side="left", padx=5)
 
-        self.search_entry = ctk.CTkEntry(self, placeholder_text="جستجو در دانلودها...", corner_radius=10)
-        self.search_entry.pack(padx=20, pady=10, fill="x")
-        self.search_entry.bind("<KeyRelease>", self.filter_list)
+        self.limit_entry = ctk.CTkEntry(self.top_frame, placeholder_text="سقف سرعت KB/s", width=120, corner_radius=10)
+        self.limit_entry.pack(side="left", padx=5)
+        self.limit_entry.bind("<Return>", self.apply_speed_limit)
 
-        self.list_frame = ctk.CTkScrollableFrame(self, corner_radius=15)
-        self.list_frame.pack(padx=20, pady=10, fill="both", expand=True)
+        self.search_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.search_frame.pack(padx=20, pady=10, fill="x")
+
+        self.search_entry = ctk.CTkEntry(self.search_frame, placeholder_text="جستجو در دانلودها...", corner_radius=10)
+        self.search_entry.pack(side="left", fill="x", expand=True)
+        self.search_entry.bind("<KeyRelease>", self.schedule_filter)
+
+        self.status_menu = ctk.CTkOptionMenu(self.search_frame, values=list(STATUS_LABELS), command=self.filter_list, width=130)
+        self.status_menu.pack(side="left", padx=5)
+
+        self.host_menu = ctk.CTkOptionMenu(self.search_frame, values=[ALL_HOSTS], command=self.filter_list, width=170)
+        self.host_menu.pack(side="left", padx=5)
+
+        self.download_list = VirtualList(self, DownloadRow, corner_radius=15)
+        self.download_list.pack(padx=20, pady=10, fill="both", expand=True)
 
         self.status_label = ctk.CTkLabel(self, text=f"پوشه دانلود: {download_directory}")
         self.status_label.pack(padx=20, pady=5)
 
+        self.totals_label = ctk.CTkLabel(self, text="")
+        self.totals_label.pack(padx=20, pady=(0, 5))
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.restore_batch()
+        self.after(REFRESH_MS, self.refresh_items)
+
+    def restore_batch(self):
+        tasks = next(self.restoring, None)
+        if tasks is None:
+            return
+        hosts = len(self.index.hosts)
+        for task in tasks:
+            self.tasks.append(task)
+            self.index.add(task)
+            if task.state == "queued":
+                self.scheduler.submit(task, task.priority)
+        if len(self.index.hosts) != hosts:
+            self.host_menu.configure(values=[ALL_HOSTS] + self.index.host_names())
+        self.apply_filter(top=False)
+        self.after(LOAD_BATCH_MS, self.restore_batch)
+
+    def on_close(self):
+        self.store.close()
+        self.destroy()
+
+    def refresh_items(self):
+        self.download_list.refresh()
+        self.ticks += 1
+        if self.ticks % STATUS_REFRESH_TICKS == 0:
+            self.update_totals()
+            if self.filter_args()[1] != "all":
+                self.apply_filter(top=False)
+        while not self.finished.empty():
+            task = self.finished.get()
+            if task.completed:
+                messagebox.showinfo("دانلود کامل شد", f"دانلود فایل '{task.local_filename}' به پایان رسید.")
+        self.after(REFRESH_MS, self.refresh_items)
+
     def select_folder(self):
         global download_directory
         folder = filedialog.askdirectory()
@@ -245,27 +214,95 @@ class IDMApp(ctk.CTk):
             download_directory = folder
             self.status_label.configure(text=f"پوشه دانلود: {download_directory}")
 
+    def apply_speed_limit(self, event=None):
+        text = self.limit_entry.get().strip()
+        try:
+            rate = int(float(text) * 1024) if text else 0
+        except ValueError:
+            messagebox.showwarning("هشدار", "سقف سرعت باید عدد باشد.")
+            return
+        set_global_limit(rate)
+        self.status_label.configure(text=f"سقف سرعت: {sizeof_fmt(rate)}/s" if rate else "سقف سرعت: بدون محدودیت")
+
     def add_to_queue(self):
-        url = self.url_entry.get().strip()
-        if not url:
+        urls = self.url_entry.get().split()
+        if not urls:
             messagebox.showwarning("هشدار", "لطفا لینک دانلود را وارد کنید.")
             return
 
-        item = DownloadItem(self.list_frame, url)
-        item.pack(fill="x", pady=5, padx=5)
-        self.download_items.append(item)
-        item.start()
+        checksum = self.checksum_entry.get().strip() or None
+        hosts = len(self.index.hosts)
+        task = self.enqueue(urls, checksum)
+        if len(self.index.hosts) != hosts:
+            self.host_menu.configure(values=[ALL_HOSTS] + self.index.host_names())
+        if self.shown_tasks is not self.tasks and self.index.matches(task, *self.filter_args()):
+            self.shown_tasks.append(task)
+        self.download_list.render()
         self.url_entry.delete(0, "end")
+        self.checksum_entry.delete(0, "end")
+
+    def import_clipboard(self):
+        try:
+            text = self.clipboard_get()
+        except TclError:
+            text = ""
+        lines = [line.split() for line in text.splitlines() if line.strip()]
+        if not lines:
+            messagebox.showwarning("هشدار", "کلیپ‌بورد لینکی ندارد.")
+            return
+        hosts = len(self.index.hosts)
+        for urls in lines:
+            self.enqueue(urls)
+        if len(self.index.hosts) != hosts:
+            self.host_menu.configure(values=[ALL_HOSTS] + self.index.host_names())
+        self.apply_filter(top=False)
+        self.update_totals()
+
+    def enqueue(self, urls, checksum=None):
+        task = Download(urls, download_directory, checksum)
+        task.update_status("در صف")
+        self.tasks.append(task)
+        self.index.add(task)
+        self.store.add(task)
+        prober.submit(task.url, lambda result: self.probed(task, result))
+        self.scheduler.submit(task)
+        return task
+
+    def probed(self, task, result):
+        if result is not None and not task.filesize:
+            task.filesize = result.filesize
+
+    def update_totals(self):
+        total = sum(task.filesize for task in self.tasks)
+        text = f"📦 {len(self.tasks)} دانلود، {sizeof_fmt(total)}"
+        pending = prober.pending()
+        if pending:
+            text += f" (بررسی {pending} لینک...)"
+        self.totals_label.configure(text=text)
+
+    def filter_args(self):
+        host = self.host_menu.get()
+        return (self.search_entry.get().strip().lower(), STATUS_LABELS[self.status_menu.get()],
+                None if host == ALL_HOSTS else host)
+
+    def schedule_filter(self, event=None):
+        if self.filter_job is not None:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(SEARCH_DELAY_MS, self.filter_list)
 
     def filter_list(self, event=None):
-        term = self.search_entry.get().strip().lower()
-        for item in self.download_items:
-            name = item.local_filename.lower()
-            if term in name:
-                item.pack(fill="x", pady=5, padx=5)
-            else:
-                item.pack_forget()
+        self.filter_job = None
+        self.apply_filter(top=True)
+
+    def apply_filter(self, top):
+        term, status, host = self.filter_args()
+        if not term and status == "all" and host is None:
+            self.shown_tasks = self.tasks
+        else:
+            self.shown_tasks = self.index.query(term, status, host)
+        self.download_list.set_models(self.shown_tasks, top=top)
 
 if __name__ == "__main__":
     app = IDMApp()
     app.mainloop()
+ 
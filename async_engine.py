@@ -0,0 +1,233 @@
+import asyncio
+import os
+import threading
+import time
+
+import aiohttp
+
+from net import MAX_CONNECTIONS_PER_HOST
+from segments import SegmentTable
+from journal import ResumeJournal, FLUSH_INTERVAL, resume_validator
+from control import RUNNING, PAUSED, CANCELLED, RELEASE_AFTER
+from ratelimit import TokenBucket, Throttle, global_bucket
+
+MAX_SEGMENTS_PER_DOWNLOAD = 4
+CHUNK_SIZE = 64 * 1024
+
+
+class AsyncDownload:
+    # همان قرارداد DownloadItem در W.py، ولی بدون ویجت و بدون Thread
+    def __init__(self, url, dest_dir, segments=MAX_SEGMENTS_PER_DOWNLOAD, on_progress=None, on_status=None):
+        self.url = url
+        self.local_filename = url.split("/")[-1].split("?")[0]
+        self.filepath = os.path.join(dest_dir, self.local_filename)
+        self.segment_count = segments
+        self.filesize = 0
+        self.validator = None
+        self.downloaded_bytes = 0
+        self.resumed_bytes = 0
+        self.is_paused = False
+        self.is_cancelled = False
+        self.is_downloading = False
+        self.status_text = "در انتظار"
+        self.start_time = None
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.loop = None
+        self.resume_event = None
+        self.bucket = TokenBucket()
+
+    def set_speed_limit(self, rate):
+        self.bucket.set_rate(rate)
+
+    def toggle_pause(self):
+        if not self.is_downloading:
+            return
+        self.is_paused = not self.is_paused
+        self._wake()
+        self.update_status("⏸ متوقف شده" if self.is_paused else "⬇️ در حال دانلود")
+
+    def cancel(self):
+        if not self.is_downloading:
+            return
+        self.is_cancelled = True
+        self._wake()
+        self.update_status("لغو شد")
+
+    def _wake(self):
+        # از هر Threadی صدا زده می‌شود؛ Event فقط داخل حلقه‌ی خودش دست می‌خورد
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._sync_event)
+
+    def _sync_event(self):
+        if self.is_paused and not self.is_cancelled:
+            self.resume_event.clear()
+        else:
+            self.resume_event.set()
+
+    def update_status(self, text):
+        self.status_text = text
+        if self.on_status:
+            self.on_status(self, text)
+
+    def update_downloaded(self, chunk_size):
+        self.downloaded_bytes += chunk_size
+        if self.on_progress:
+            self.on_progress(self)
+
+    async def run(self, session):
+        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.resume_event = asyncio.Event()
+        self.resume_event.set()
+        self.is_paused = False
+        self.is_cancelled = False
+        self.is_downloading = True
+        self.downloaded_bytes = 0
+        self.resumed_bytes = 0
+        self.start_time = time.time()
+        self.update_status("⬇️ در حال دانلود")
+
+        try:
+            async with session.head(self.url, allow_redirects=True) as r:
+                self.filesize = int(r.headers.get("Content-Length", 0))
+                self.validator = resume_validator(r.headers)
+                accept_ranges = r.headers.get("Accept-Ranges", "none")
+            if accept_ranges != "bytes" or self.filesize == 0:
+                ok = await self._download_single(session)
+            else:
+                ok = await self._download_segmented(session)
+            if ok and not self.is_cancelled:
+                self.update_status("✅ کامل شد")
+        except Exception as e:
+            self.update_status(f"❌ خطا: {str(e)}")
+        self.is_downloading = False
+
+    async def _wait_if_paused(self, timeout=None):
+        if self.is_paused:
+            try:
+                await asyncio.wait_for(self.resume_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return PAUSED
+        return CANCELLED if self.is_cancelled else RUNNING
+
+    async def _throttle(self, throttle, n):
+        wait = throttle.reserve(n)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _download_single(self, session):
+        throttle = Throttle(global_bucket, self.bucket)
+        async with session.get(self.url) as r:
+            if r.status != 200:
+                self.update_status(f"❌ خطا HTTP {r.status}")
+                return False
+            with open(self.filepath, "wb") as f:
+                async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                    if await self._wait_if_paused() == CANCELLED:
+                        return False
+                    f.write(chunk)
+                    self.update_downloaded(len(chunk))
+                    await self._throttle(throttle, len(chunk))
+        return True
+
+    async def _download_segmented(self, session):
+        journal = ResumeJournal(self.filepath, self.url, self.filesize, self.validator)
+        ranges = journal.load()
+        if ranges:
+            table = SegmentTable.from_ranges(self.filesize, ranges)
+            self.resumed_bytes = self.filesize - table.remaining()
+            self.downloaded_bytes = self.resumed_bytes
+        else:
+            with open(self.filepath, "wb") as f:
+                f.truncate(self.filesize)
+            table = SegmentTable(self.filesize, self.segment_count)
+        journal.attach(table)
+
+        results = await asyncio.gather(*(self._segment_task(session, table, journal)
+                                         for _ in range(self.segment_count)))
+        # fsync ژورنال نباید حلقه را نگه دارد
+        if table.is_complete():
+            await self.loop.run_in_executor(None, journal.remove)
+        else:
+            await self.loop.run_in_executor(None, journal.flush)
+        return all(results) and table.is_complete()
+
+    async def _segment_task(self, session, table, journal):
+        owner = object()
+        with open(self.filepath, "r+b", buffering=0) as f:
+            while True:
+                seg = table.acquire(owner)
+                if seg is None:
+                    return True
+                try:
+                    ok = await self._fetch_segment(session, seg, f, journal)
+                finally:
+                    table.release(seg)
+                if not ok:
+                    return False
+
+    async def _fetch_segment(self, session, seg, f, journal):
+        while True:
+            result = await self._fetch_range(session, seg, f, journal)
+            if result != PAUSED:
+                return result
+            if await self._wait_if_paused() == CANCELLED:
+                return False
+
+    async def _fetch_range(self, session, seg, f, journal):
+        throttle = Throttle(global_bucket, self.bucket)
+        headers = {"Range": f"bytes={seg.pos}-{seg.end}"}
+        if self.validator:
+            headers["If-Range"] = self.validator
+        async with session.get(self.url, headers=headers) as r:
+            if r.status == 416 or r.status == 200 and self.validator:
+                # فایل روی سرور عوض شده؛ ادامه دادن فایل را خراب می‌کند
+                self.update_status("❌ فایل روی سرور عوض شده")
+                return False
+            if r.status != 206 and not (r.status == 200 and seg.pos == 0):
+                self.update_status(f"❌ خطا HTTP {r.status}")
+                return False
+            f.seek(seg.pos)
+            async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                state = await self._wait_if_paused(RELEASE_AFTER)
+                if state != RUNNING:
+                    return False if state == CANCELLED else PAUSED
+                chunk = chunk[:seg.remaining()]
+                f.write(chunk)
+                seg.pos += len(chunk)
+                self.update_downloaded(len(chunk))
+                if time.time() - journal.last_flush >= FLUSH_INTERVAL:
+                    journal.last_flush = time.time()
+                    self.loop.run_in_executor(None, journal.flush)
+                await self._throttle(throttle, len(chunk))
+                if seg.is_done():
+                    break
+        return True
+
+
+class AsyncEngine:
+    # یک event loop در یک Thread برای همه‌ی دانلودها
+    def __init__(self, max_connections_per_host=MAX_CONNECTIONS_PER_HOST):
+        self.max_connections_per_host = max_connections_per_host
+        self.session = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, download):
+        return asyncio.run_coroutine_threadsafe(self._run(download), self.loop)
+
+    async def _run(self, download):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.max_connections_per_host)
+            timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=10)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                 headers={"Accept-Encoding": "identity"})
+        await download.run(self.session)
+
+    def close(self):
+        if self.session is not None:
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,576 @@
+import argparse
+import email.utils
+import http.server
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from ratelimit import TokenBucket
+from control import DownloadControl
+from progress import ProgressMeter
+
+# سرور محلی با پشتیبانی Range تا بنچمارک به اینترنت وابسته نباشد
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    root = "."
+    # تاخیر قبل از هر پاسخ (ثانیه)، سقف سرعت هر اتصال (بایت بر ثانیه، 0 یعنی بی‌سقف) و keep-alive
+    latency = 0.0
+    rate = 0
+    keepalive = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_file(False)
+
+    def do_GET(self):
+        self.send_file(True)
+
+    def send_file(self, with_body):
+        url = urlsplit(self.path)
+        path = os.path.join(self.root, url.path.lstrip("/"))
+        # ?ranges=0 مثل سروری رفتار می‌کند که Range ندارد (مسیر تک‌رشته‌ای engine)
+        ranges = parse_qs(url.query).get("ranges") != ["0"]
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.keepalive:
+            self.close_connection = True
+        if not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        st = os.stat(path)
+        size = st.st_size
+        etag = f'"{size:x}-{st.st_mtime_ns:x}"'
+        last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        if self.not_modified(etag, st.st_mtime):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        start, end, code = 0, size - 1, 200
+        m = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        # If-Range که با نسخه‌ی فعلی نخواند یعنی کل فایل با 200
+        if_range = self.headers.get("If-Range")
+        if m and ranges and (if_range is None or if_range in (etag, last_modified)):
+            start = int(m.group(1))
+            end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+            code = 206
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        self.send_response(code)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if not self.keepalive:
+            self.send_header("Connection", "close")
+        if code == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not with_body:
+            return
+
+        started = time.monotonic()
+        sent = 0
+        with open(path, "rb") as f:
+            f.seek(start)
+            left = end - start + 1
+            while left > 0:
+                data = f.read(min(64 * 1024, left))
+                try:
+                    self.wfile.write(data)
+                except OSError:
+                    return
+                left -= len(data)
+                sent += len(data)
+                if self.rate:
+                    ahead = sent / self.rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+    def not_modified(self, etag, mtime):
+        # If-None-Match بر If-Modified-Since مقدم است (RFC 9110)
+        if "If-None-Match" in self.headers:
+            return etag in [t.strip() for t in self.headers["If-None-Match"].split(",")]
+        since = self.headers.get("If-Modified-Since")
+        if since:
+            try:
+                return int(mtime) <= email.utils.parsedate_to_datetime(since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # تعداد اتصال‌های TCP پذیرفته‌شده؛ برای اینکه ببینیم keep-alive واقعا استفاده می‌شود
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # کلاینت اتصال را وسط کار می‌بندد (لغو، دزدیدن تکه)؛ این خطا نیست
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(port, root, latency=0.0, rate=0, keepalive=True):
+    RangeHandler.root = root
+    RangeHandler.latency = latency
+    RangeHandler.rate = rate
+    RangeHandler.keepalive = keepalive
+    server = QuietServer(("127.0.0.1", port), RangeHandler)
+    server.serve_forever()
+
+
+def start_server(root, port, latency=0.0, rate=0, keepalive=True):
+    # سرور در پروسه‌ی جدا، تا CPU آن در اندازه‌گیری کلاینت حساب نشود
+    cmd = [sys.executable, __file__, "serve", "--port", str(port), "--root", root,
+           "--latency", str(latency * 1000), "--rate", str(rate / 1024)]
+    if not keepalive:
+        cmd.append("--no-keepalive")
+    proc = subprocess.Popen(cmd)
+    time.sleep(0.5)
+    return proc
+
+
+def make_files(root, count, size):
+    data = os.urandom(size)
+    for i in range(count):
+        with open(os.path.join(root, f"f{i}.bin"), "wb") as f:
+            f.write(data)
+
+
+class HeadlessItem:
+    # کمترین چیزی که DownloadWorker از engine.Download لازم دارد
+    def __init__(self, url, dest_dir):
+        self.url = url
+        self.local_filename = url.split("/")[-1]
+        self.filepath = os.path.join(dest_dir, self.local_filename)
+        self.filesize = 0
+        self.meter = ProgressMeter()
+        self.is_downloading = True
+        self.status_text = ""
+        self.bucket = TokenBucket()
+        self.control = DownloadControl()
+        self.control.start()
+
+    @property
+    def downloaded_bytes(self):
+        return self.meter.total()
+
+    def update_status(self, text):
+        self.status_text = text
+
+
+def run_threaded(urls, dest_dir, segments):
+    import net
+    from engine import DownloadWorker
+    from segments import SegmentTable
+    from journal import ResumeJournal
+    from storage import DiskSink
+    from mirrors import MirrorSet
+
+    def download(item):
+        r = net.head(item.url)
+        item.filesize = int(r.headers["Content-Length"])
+        table = SegmentTable(item.filesize, segments)
+        journal = ResumeJournal(item.filepath, item.url, item.filesize)
+        sink = DiskSink(item.filepath, item.filesize)
+        journal.attach(table, sink)
+        mirrors = MirrorSet([item.url])
+        workers = [DownloadWorker(mirrors, table, journal, sink, item, i) for i in range(segments)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        sink.close()
+        journal.remove()
+
+    items = [HeadlessItem(url, dest_dir) for url in urls]
+    threads = [threading.Thread(target=download, args=(item,), daemon=True) for item in items]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return items
+
+
+def run_async(urls, dest_dir, segments):
+    from async_engine import AsyncEngine, AsyncDownload
+
+    engine = AsyncEngine()
+    items = [AsyncDownload(url, dest_dir, segments) for url in urls]
+    futures = [engine.submit(item) for item in items]
+    for fut in futures:
+        fut.result()
+    engine.close()
+    return items
+
+
+ENGINES = {"threaded": run_threaded, "async": run_async}
+
+
+class ThreadSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+
+def bench_engines(args):
+    root = tempfile.mkdtemp(prefix="idm-srv-")
+    make_files(root, args.downloads, args.size)
+    server = start_server(root, args.port)
+    try:
+        for name in args.engines:
+            dest = tempfile.mkdtemp(prefix="idm-dl-")
+            urls = [f"http://127.0.0.1:{args.port}/f{i}.bin" for i in range(args.downloads)]
+            sampler = ThreadSampler()
+            sampler.start()
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            items = ENGINES[name](urls, dest, args.segments)
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            sampler.stopped.set()
+            total = sum(item.downloaded_bytes for item in items)
+            failed = sum(1 for item in items if item.downloaded_bytes != args.size)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{name:9s} {args.downloads} x {args.size / 2**20:.1f} MB, {args.segments} seg: "
+                  f"{total / wall / 2**20:8.1f} MB/s  cpu {cpu / (total / 2**30):6.2f} s/GB  "
+                  f"threads {sampler.peak:5d}  maxrss {rss:7.1f} MB  failed {failed}")
+            shutil.rmtree(dest, ignore_errors=True)
+    finally:
+        server.terminate()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def read_with_iter_content(r, f):
+    for chunk in r.iter_content(chunk_size=8192):
+        f.write(chunk)
+
+
+def read_with_chunk_reader(r, f):
+    from chunkreader import iter_chunks
+    for chunk in iter_chunks(r):
+        f.write(chunk)
+
+
+READERS = {"iter_content": read_with_iter_content, "chunkreader": read_with_chunk_reader}
+
+
+def bench_readers(args):
+    import net
+
+    root = tempfile.mkdtemp(prefix="idm-srv-")
+    make_files(root, 1, args.size)
+    server = start_server(root, args.port)
+    url = f"http://127.0.0.1:{args.port}/f0.bin"
+    try:
+        for name, reader in READERS.items():
+            with tempfile.TemporaryFile() as f:
+                wall = time.perf_counter()
+                cpu = time.process_time()
+                for _ in range(args.repeat):
+                    f.seek(0)
+                    with net.get(url, stream=True, headers={"Accept-Encoding": "identity"}) as r:
+                        reader(r, f)
+                wall = time.perf_counter() - wall
+                cpu = time.process_time() - cpu
+            gb = args.size * args.repeat / 2**30
+            print(f"{name:12s} {args.repeat} x {args.size / 2**20:.0f} MB: "
+                  f"{gb * 1024 / wall:8.1f} MB/s  cpu {cpu / gb:6.2f} s/GB")
+    finally:
+        server.terminate()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_list(args):
+    import tracemalloc
+    from engine import Download
+
+    for count in args.items:
+        urls = [f"http://mirror{i % 50}.example.com/pub/file-{i}.bin" for i in range(count)]
+        wall = time.perf_counter()
+        tasks = [Download(url, "downloads") for url in urls]
+        build = time.perf_counter() - wall
+        # حافظه جدا اندازه گرفته می‌شود چون tracemalloc خودش ساختن را کند می‌کند
+        tracemalloc.start()
+        sample = [Download(url, "downloads") for url in urls[:10000]]
+        memory = tracemalloc.get_traced_memory()[0] / len(sample)
+        tracemalloc.stop()
+        del sample
+
+        wall = time.perf_counter()
+        shown = [task for task in tasks if "-12" in task.local_filename.lower()]
+        scan = time.perf_counter() - wall
+        print(f"{count:7d} items: build {build * 1000:7.1f} ms  model {memory:6.0f} B/item  "
+              f"scan filter {scan * 1000:6.1f} ms ({len(shown)} hits)")
+        bench_search(tasks)
+        bench_list_view(tasks, args.scrolls)
+
+
+def bench_search(tasks):
+    from search import SearchIndex
+
+    wall = time.perf_counter()
+    index = SearchIndex()
+    for task in tasks:
+        index.add(task)
+    build = time.perf_counter() - wall
+
+    # تایپ حرف به حرف، مثل کاربر؛ هر مرحله از نتیجه‌ی مرحله‌ی قبل استفاده می‌کند
+    times = []
+    for term in ("f", "fi", "fil", "file", "file-", "file-1", "file-12", "file-123"):
+        wall = time.perf_counter()
+        hits = index.query(term)
+        times.append((term, time.perf_counter() - wall, len(hits)))
+    index.last_key = None
+    wall = time.perf_counter()
+    hits = index.query("e-4567", host="mirror17.example.com")
+    cold = time.perf_counter() - wall
+    steps = "  ".join(f"{term!r} {t * 1000:.1f}ms/{n}" for term, t, n in times)
+    print(f"  index: build {build * 1000:7.1f} ms")
+    print(f"  typing: {steps}")
+    print(f"  cold trigram + host query: {cold * 1000:.2f} ms ({len(hits)} hits)")
+
+
+def bench_list_view(tasks, scrolls):
+    # بخش رابط کاربری فقط وقتی نمایشگر هست اجرا می‌شود
+    try:
+        import customtkinter as ctk
+        app = ctk.CTk()
+    except Exception as e:
+        print(f"  view: skipped ({e})")
+        return
+    from listview import VirtualList
+    from W import DownloadRow
+
+    app.geometry("900x600")
+    view = VirtualList(app, DownloadRow)
+    view.pack(fill="both", expand=True)
+    app.update()
+    wall = time.perf_counter()
+    view.set_models(tasks)
+    app.update()
+    first = time.perf_counter() - wall
+
+    wall = time.perf_counter()
+    step = max(1, len(tasks) // scrolls)
+    for i in range(scrolls):
+        view.scroll_to(i * step)
+        app.update()
+    scroll = (time.perf_counter() - wall) / scrolls
+
+    wall = time.perf_counter()
+    for _ in range(scrolls):
+        view.refresh()
+        app.update()
+    tick = (time.perf_counter() - wall) / scrolls
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"  view: {len(view.rows)} rows  first paint {first * 1000:6.1f} ms  "
+          f"scroll {scroll * 1000:6.2f} ms  refresh tick {tick * 1000:6.2f} ms  maxrss {rss:7.1f} MB")
+    app.destroy()
+
+
+# مسیرهایی که برنامه‌ها واقعا از آن دانلود می‌کنند؛ S.py و W.py فقط نمای engine.Download هستند
+PATHS = ("multi", "single", "cli")
+RESULTS_FILE = "bench-results.jsonl"
+
+
+def run_one(args):
+    # در پروسه‌ی جدا اجرا می‌شود تا CPU و حافظه‌ی هر اندازه‌گیری جدا باشد
+    import chunkreader
+    chunkreader.MAX_CHUNK = args.chunk
+    import engine
+    if args.segments:
+        # تعداد ثابت؛ 0 یعنی تنظیم خودکار با tuner.py
+        engine.INITIAL_THREADS = engine.MAX_THREADS_PER_DOWNLOAD = args.segments
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if args.path == "cli":
+        import T
+        ok = T.main(["-d", args.dest, args.url]) == T.EXIT_OK
+    else:
+        task = engine.Download(args.url, args.dest)
+        task.run_download()
+        ok = task.completed
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    name = args.url.split("/")[-1].split("?")[0]
+    size = os.path.getsize(os.path.join(args.dest, name)) if ok else 0
+    json.dump({"ok": ok, "bytes": size, "wall": wall, "cpu": cpu,
+               "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}, sys.stdout)
+
+
+def measure(url, path, segments, chunk):
+    dest = tempfile.mkdtemp(prefix="idm-dl-")
+    try:
+        out = subprocess.run([sys.executable, __file__, "one", "--path", path, "--url", url, "--dest", dest,
+                              "--segments", str(segments), "--chunk", str(chunk)],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+        return json.loads(out)
+    finally:
+        shutil.rmtree(dest, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_results(path):
+    # آخرین نتیجه برای هر تنظیم، برای مقایسه با اجرای فعلی
+    last = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                last[json.dumps(record["params"], sort_keys=True)] = record
+    except (OSError, ValueError):
+        pass
+    return last
+
+
+def bench_paths(args):
+    root = tempfile.mkdtemp(prefix="idm-srv-")
+    make_files(root, 1, args.size)
+    server = start_server(root, args.port, args.latency / 1000, int(args.rate * 1024), not args.no_keepalive)
+    previous = load_results(args.out)
+    revision = git_revision()
+    try:
+        runs = []
+        for path in args.paths:
+            # تک‌رشته‌ای تعداد تکه ندارد
+            for segments in ([1] if path == "single" else args.segments):
+                for chunk in args.chunks:
+                    runs.append((path, segments, chunk))
+        for path, segments, chunk in runs:
+            url = f"http://127.0.0.1:{args.port}/f0.bin" + ("?ranges=0" if path == "single" else "")
+            params = {"path": path, "size": args.size, "segments": segments, "chunk": chunk,
+                      "latency_ms": args.latency, "rate_kbs": args.rate, "keepalive": not args.no_keepalive}
+            samples = [measure(url, path, segments, chunk) for _ in range(args.repeat)]
+            best = min(samples, key=lambda r: r["wall"])
+            gb = best["bytes"] / 2**30
+            result = {"ok": all(r["ok"] for r in samples),
+                      "mb_s": best["bytes"] / best["wall"] / 2**20 if best["wall"] else 0.0,
+                      "cpu_s_gb": best["cpu"] / gb if gb else None,
+                      "maxrss_mb": max(r["maxrss"] for r in samples)}
+            line = (f"{path:6s} seg {segments or 'auto':>4} chunk {chunk // 1024:5d}K: {result['mb_s']:8.1f} MB/s  "
+                    f"cpu {result['cpu_s_gb'] or 0:6.2f} s/GB  maxrss {result['maxrss_mb']:6.1f} MB")
+            if not result["ok"]:
+                line += "  FAILED"
+            old = previous.get(json.dumps(params, sort_keys=True))
+            if old and old["result"]["mb_s"]:
+                change = (result["mb_s"] / old["result"]["mb_s"] - 1) * 100
+                line += f"  {change:+6.1f}% vs {old.get('revision') or 'previous'}"
+            print(line, flush=True)
+            with open(args.out, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"time": time.time(), "revision": revision, "python": sys.version.split()[0],
+                                    "params": params, "result": result}) + "\n")
+    finally:
+        server.terminate()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def parse_size(text):
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text[-1].upper() in units:
+        return int(float(text[:-1]) * units[text[-1].upper()])
+    return int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Python IDM benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--root", default=".")
+    p.add_argument("--latency", type=float, default=0, help="delay before each response in ms")
+    p.add_argument("--rate", type=float, default=0, help="per-connection limit in KB/s")
+    p.add_argument("--no-keepalive", action="store_true")
+
+    p = sub.add_parser("engines")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--downloads", type=int, default=200)
+    p.add_argument("--size", type=parse_size, default=parse_size("4M"))
+    p.add_argument("--segments", type=int, default=4)
+    p.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+
+    p = sub.add_parser("readers")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--size", type=parse_size, default=parse_size("256M"))
+    p.add_argument("--repeat", type=int, default=4)
+
+    p = sub.add_parser("list")
+    p.add_argument("--items", type=int, nargs="+", default=[10000, 100000])
+    p.add_argument("--scrolls", type=int, default=200)
+
+    p = sub.add_parser("paths", help="T.py, single- and multi-threaded engine over segment and chunk sweeps")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--size", type=parse_size, default=parse_size("64M"))
+    p.add_argument("--paths", nargs="+", default=list(PATHS), choices=PATHS)
+    p.add_argument("--segments", type=int, nargs="+", default=[0, 1, 2, 4, 8], help="0 = adaptive")
+    p.add_argument("--chunks", type=parse_size, nargs="+", default=[parse_size("64K"), parse_size("1M")])
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--latency", type=float, default=0, help="server delay before each response in ms")
+    p.add_argument("--rate", type=float, default=0, help="server per-connection limit in KB/s")
+    p.add_argument("--no-keepalive", action="store_true")
+    p.add_argument("--out", default=RESULTS_FILE, help="results are appended here as JSON lines")
+
+    p = sub.add_parser("one")
+    p.add_argument("--path", choices=PATHS, required=True)
+    p.add_argument("--url", required=True)
+    p.add_argument("--dest", required=True)
+    p.add_argument("--segments", type=int, default=0)
+    p.add_argument("--chunk", type=int, default=1024 * 1024)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.port, args.root, args.latency / 1000, int(args.rate * 1024), not args.no_keepalive)
+    elif args.command == "paths":
+        bench_paths(args)
+    elif args.command == "one":
+        run_one(args)
+    elif args.command == "readers":
+        bench_readers(args)
+    elif args.command == "list":
+        bench_list(args)
+    else:
+        bench_engines(args)
+
+
+if __name__ == "__main__":
+    main()
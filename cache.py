@@ -0,0 +1,147 @@
+import atexit
+import json
+import os
+import shutil
+import threading
+
+from journal import JOURNAL_SUFFIX
+
+# برای هر لینک، هر فایل کاملی که از آن ساخته شده (مسیر مطلق) با validator خودش (ETag / Last-Modified)؛
+# بدون validator هم ثبت می‌شود تا دانلود بعدی همان لینک فایل خودش را بازنویسی کند، نه "name (1)"
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".python-idm", "cache.json")
+# cache.json بعد از هر دانلود بازنویسی نمی‌شود؛ تغییرهای این بازه با هم نوشته می‌شوند
+SAVE_DELAY = 1.0
+
+
+def journal_url(filepath):
+    # دانلود نیمه‌کاره‌ی همین مسیر مال کدام لینک است
+    try:
+        with open(filepath + JOURNAL_SUFFIX, "r", encoding="utf-8") as f:
+            return json.load(f).get("url")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _numbered(path, n):
+    if n == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root} ({n}){ext}"
+
+
+class DownloadCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None
+        # مسیرهای دانلودهای در جریان: مسیر -> Download
+        self.claimed = {}
+        self.dirty = False
+        self.timer = None
+        # دو نوشتن همزمان نباید نسخه‌ی قدیمی‌تر را روی جدیدتر بگذارند
+        self.save_lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+            for url, entry in self.entries.items():
+                if "filepath" in entry:
+                    # قالب قدیمی: یک فایل برای هر لینک
+                    self.entries[url] = {os.path.abspath(entry.pop("filepath")): entry}
+        return self.entries
+
+    def _schedule_save(self):
+        # زیر self.lock صدا زده می‌شود
+        self.dirty = True
+        if self.timer is None:
+            self.timer = threading.Timer(SAVE_DELAY, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.save_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return
+                self.dirty = False
+                # فقط کپی سطحی زیر قفل؛ claim پشت json و دیسک منتظر نمی‌ماند
+                entries = {url: dict(files) for url, files in self.entries.items()}
+            data = json.dumps(entries)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+
+    def lookup(self, url):
+        # تازه‌ترین نسخه‌ای که validator دارد و فایلش هنوز همان است که دانلود شده بود
+        with self.lock:
+            files = list(self._load().get(url, {}).items())
+        for filepath, entry in reversed(files):
+            if not entry.get("etag") and not entry.get("last_modified"):
+                continue
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            if st.st_size == entry["filesize"] and st.st_mtime_ns == entry["mtime_ns"]:
+                return dict(entry, filepath=filepath)
+        return None
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, task):
+        # مسیر مطلق؛ وگرنه نتیجه به پوشه‌ای بستگی دارد که برنامه از آن اجرا شده
+        filepath = os.path.abspath(task.filepath)
+        st = os.stat(filepath)
+        with self.lock:
+            files = self._load().setdefault(task.url, {})
+            # آخرین نوشته آخر فهرست می‌ماند تا lookup اول آن را ببیند
+            files.pop(filepath, None)
+            files[filepath] = {"filesize": st.st_size, "mtime_ns": st.st_mtime_ns,
+                               "etag": task.etag, "last_modified": task.last_modified}
+            self._schedule_save()
+
+    def claim(self, task, path):
+        # دو دانلود با نام یکسان روی هم نمی‌نویسند؛ دومی "name (1).ext" می‌شود.
+        # مسیری که مال همین لینک است (نیمه‌کاره یا نسخه‌ی قبلی) دوباره استفاده می‌شود.
+        with self.lock:
+            owned = self._load().get(task.url, {})
+            n = 0
+            while True:
+                candidate = _numbered(path, n)
+                owner = self.claimed.get(candidate)
+                if owner is None or owner is task:
+                    if (not os.path.exists(candidate) or journal_url(candidate) == task.url
+                            or os.path.abspath(candidate) in owned):
+                        self.claimed[candidate] = task
+                        return candidate
+                n += 1
+
+    def release(self, task):
+        with self.lock:
+            if self.claimed.get(task.filepath) is task:
+                del self.claimed[task.filepath]
+
+
+def copy_result(source, target):
+    # نتیجه‌ی یک دانلود برای آیتم دیگری با همان لینک؛ بدون اتصال دوباره به سرور
+    if os.path.abspath(source) != os.path.abspath(target):
+        shutil.copyfile(source, target)
+
+
+cache = DownloadCache()
+atexit.register(cache.flush)
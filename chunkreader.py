@@ -0,0 +1,74 @@
+import time
+
+# اندازه‌ی بافر با سرعت اندازه‌گیری‌شده تغییر می‌کند تا هر خواندن حدود TARGET_READ_TIME طول بکشد
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 1024 * 1024  # نباید از segments.MIN_SPLIT_SIZE بزرگ‌تر شود
+TARGET_READ_TIME = 0.05
+# خواندنی که بیشتر از این طول بکشد در metrics.STALLS شمرده می‌شود
+STALL_TIME = 2.0
+
+
+class ChunkReader:
+    def __init__(self, response, max_size=None, allocate=True):
+        # پیش‌فرض موقع ساختن خوانده می‌شود تا bench.py بتواند MAX_CHUNK را عوض کند
+        max_size = max_size or MAX_CHUNK
+        self.response = response
+        self.raw = response.raw
+        # با allocate=False بافر را صدا زننده می‌دهد (مثلا از BufferPool در storage.py)
+        self.view = memoryview(bytearray(max_size)) if allocate else None
+        self.max_size = max_size
+        self.size = MIN_CHUNK
+        self.eof = False
+        self.stalls = 0
+
+        # readinto عمومی urllib3 خودش یک bytes موقت می‌سازد؛ برای بدنه‌ی بدون فشرده‌سازی
+        # مستقیم از http.client داخل بافر خودمان می‌خوانیم
+        encoding = response.headers.get("Content-Encoding", "identity").lower()
+        fp = getattr(self.raw, "_fp", None)
+        self.direct = encoding == "identity" and fp is not None and hasattr(fp, "readinto")
+        self._readinto = fp.readinto if self.direct else self._decoded_readinto
+
+    def _decoded_readinto(self, view):
+        data = self.raw.read(len(view), decode_content=True)
+        view[:len(data)] = data
+        return len(data)
+
+    def readinto(self, buf):
+        if self.eof:
+            return 0
+        started = time.monotonic()
+        n = self._readinto(memoryview(buf)[:self.size])
+        elapsed = time.monotonic() - started
+        if n == 0:
+            self.eof = True
+            # بدنه کامل خوانده شد؛ اتصال را به pool برمی‌گردانیم تا keep-alive بماند
+            if self.direct:
+                self.raw.release_conn()
+            return 0
+        if elapsed > STALL_TIME:
+            self.stalls += 1
+        self._adapt(n, elapsed)
+        return n
+
+    def read(self):
+        # memoryview برگشتی فقط تا read بعدی معتبر است
+        n = self.readinto(self.view)
+        return self.view[:n]
+
+    def _adapt(self, n, elapsed):
+        if n < self.size:
+            return
+        target = n / elapsed * TARGET_READ_TIME if elapsed > 0 else self.max_size
+        if target > self.size * 2 and self.size < self.max_size:
+            self.size = min(self.size * 2, self.max_size)
+        elif target < self.size / 2 and self.size > MIN_CHUNK:
+            self.size = max(self.size // 2, MIN_CHUNK)
+
+
+def iter_chunks(response, max_size=None):
+    reader = ChunkReader(response, max_size)
+    while True:
+        chunk = reader.read()
+        if not chunk:
+            return
+        yield chunk
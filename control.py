@@ -0,0 +1,51 @@
+import threading
+
+IDLE = "idle"
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+
+# بعد از این مدت مکث، Workerها اتصال را می‌بندند و بعدا با Range از همان offset ادامه می‌دهند
+RELEASE_AFTER = 15.0
+
+
+class DownloadControl:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.state = IDLE
+
+    def _move(self, new_state, allowed):
+        with self.cond:
+            if self.state not in allowed:
+                return False
+            self.state = new_state
+            self.cond.notify_all()
+            return True
+
+    def start(self):
+        return self._move(RUNNING, (IDLE, RUNNING, CANCELLED))
+
+    def pause(self):
+        return self._move(PAUSED, (RUNNING,))
+
+    def resume(self):
+        return self._move(RUNNING, (PAUSED,))
+
+    def cancel(self):
+        # از IDLE هم؛ دانلودی که هنوز شروع نشده (مثلا از صف ذخیره‌شده) هم لغوشده می‌ماند
+        return self._move(CANCELLED, (IDLE, RUNNING, PAUSED))
+
+    def reset(self):
+        return self._move(IDLE, (IDLE, RUNNING, PAUSED, CANCELLED))
+
+    def sleep(self, seconds, until=(CANCELLED,)):
+        # مثل time.sleep، ولی با رسیدن به یکی از وضعیت‌های until (پیش‌فرض لغو) زودتر بیدار می‌شود؛ وضعیت نهایی را برمی‌گرداند
+        with self.cond:
+            self.cond.wait_for(lambda: self.state in until, seconds)
+            return self.state
+
+    def wait_running(self, timeout=None):
+        # تا وقتی متوقف است بدون مصرف CPU می‌خوابد؛ وضعیت نهایی را برمی‌گرداند
+        with self.cond:
+            self.cond.wait_for(lambda: self.state != PAUSED, timeout)
+            return self.state
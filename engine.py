@@ -0,0 +1,626 @@
+import hashlib
+import os
+import random
+import threading
+import time
+
+import metrics
+import net
+from cache import cache, copy_result
+from chunkreader import ChunkReader, iter_chunks, MIN_CHUNK
+from control import DownloadControl, RUNNING, PAUSED, CANCELLED, RELEASE_AFTER
+from integrity import load_checksum, PieceVerifier, StreamHasher
+from journal import ResumeJournal, resume_validator
+from mirrors import MirrorSet, MirrorSampler, SWITCH_MIRROR
+from probe import prober
+from progress import ProgressMeter
+from ratelimit import TokenBucket, Throttle, global_bucket
+from scheduler import host_of
+from segments import SegmentTable
+from storage import DiskSink
+from tuner import ConnectionTuner, PROBE_INTERVAL
+
+# هر دانلود با INITIAL_THREADS اتصال شروع می‌کند و تا وقتی سرعت بهتر شود تا سقف بالا می‌رود
+INITIAL_THREADS = 2
+MAX_THREADS_PER_DOWNLOAD = 8
+# چند بار پیس‌های خراب دوباره گرفته شوند قبل از اینکه دانلود خطا بدهد
+MAX_VERIFY_ROUNDS = 3
+# اگر فایل روی سرور وسط دانلود عوض شود، این‌قدر بار از اول شروع می‌کنیم
+MAX_RESTARTS = 2
+# تلاش دوباره‌ی یک تکه بعد از خطای شبکه؛ هر بار که تکه جلو برود شمارش از اول شروع می‌شود
+MAX_SEGMENT_RETRIES = 8
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+# اگر انتهای تکه دزدیده شده باشد و این‌قدر یا کمتر از پاسخ مانده باشد، خوانده و دور ریخته می‌شود
+# تا اتصال به pool برگردد؛ بیشتر از این، بستن اتصال از دانلود دوباره‌ی داده ارزان‌تر است
+DRAIN_LIMIT = 256 * 1024
+
+_lazy_lock = threading.Lock()
+
+
+def _lazy(name, factory):
+    # شیء‌های قفل‌دار فقط وقتی ساخته می‌شوند که لازم شوند؛ صف ممکن است صدها هزار Download داشته باشد
+    def get(self):
+        value = self.__dict__.get(name)
+        if value is None:
+            with _lazy_lock:
+                value = self.__dict__.get(name)
+                if value is None:
+                    value = self.__dict__[name] = factory()
+        return value
+    return property(get)
+
+
+def record_range(host, received, elapsed, stalls=0):
+    # یک بار برای هر درخواست، نه برای هر chunk
+    metrics.BYTES.inc(host, amount=received)
+    if received:
+        metrics.SEGMENT_BYTES.observe(value=received)
+        if elapsed > 0:
+            metrics.SEGMENT_THROUGHPUT.observe(host, value=received / elapsed)
+    if stalls:
+        metrics.STALLS.inc(host, amount=stalls)
+
+
+def retry_delay(attempt, retry_after=0):
+    # نمایی با jitter تا Workerهایی که با هم قطع شده‌اند با هم برنگردند
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+    return max(delay / 2 + random.uniform(0, delay / 2), min(retry_after, RETRY_MAX_DELAY))
+
+
+class DownloadWorker(threading.Thread):
+    def __init__(self, mirrors, table, journal, sink, parent_item, idx, verifier=None):
+        super().__init__()
+        self.mirrors = mirrors
+        self.table = table
+        self.journal = journal
+        self.sink = sink
+        self.verifier = verifier
+        self.parent_item = parent_item
+        self.control = parent_item.control
+        self.counter = parent_item.meter.new_counter()
+        self.throttle = Throttle(global_bucket, parent_item.bucket, control=self.control)
+        self.idx = idx
+        self.daemon = True
+        # retiring: تنظیم‌کننده این اتصال را کنار گذاشته؛ slot: یک سهم از net.connection_budget دارد
+        self.retiring = False
+        self.slot = False
+
+    def run(self):
+        try:
+            # وقتی تکه‌ی خودمان تمام شد، از تکه‌ی بزرگ‌ترِ بقیه برمی‌داریم
+            while not self.retiring:
+                seg = self.table.acquire(self)
+                if seg is None:
+                    return
+                try:
+                    ok = self.fetch_segment(seg)
+                finally:
+                    self.table.release(seg)
+                if not ok:
+                    return
+        except Exception as e:
+            self.parent_item.update_status(f"❌ خطا: {str(e)}")
+            self.parent_item.is_downloading = False
+        finally:
+            if self.slot:
+                net.connection_budget.release()
+
+    def fetch_segment(self, seg):
+        attempt = 0
+        while True:
+            mirror = self.mirrors.acquire()
+            if mirror is None:
+                return False
+            pos = seg.pos
+            try:
+                result = self.fetch_range(seg, mirror)
+            except net.NETWORK_ERRORS as e:
+                # اگر Mirror دیگری مانده، همین تکه از seg.pos از آن ادامه پیدا می‌کند
+                if self.mirrors.failed(mirror):
+                    metrics.RETRIES.inc(host_of(mirror.url), "network")
+                    continue
+                # آخرین Mirror: بعد از کمی صبر با Range از seg.pos، نه از ابتدای تکه
+                if seg.pos > pos:
+                    attempt = 0
+                if attempt >= MAX_SEGMENT_RETRIES:
+                    raise
+                delay = retry_delay(attempt, getattr(e, "retry_after", 0))
+                attempt += 1
+                metrics.RETRIES.inc(host_of(mirror.url), "backoff")
+                if self.control.sleep(delay) == CANCELLED:
+                    return False
+                continue
+            finally:
+                self.mirrors.release(mirror)
+            if result == SWITCH_MIRROR:
+                metrics.RETRIES.inc(host_of(mirror.url), "switch")
+                continue
+            if result != PAUSED:
+                return result
+            # مکث طولانی بود و اتصال را بستیم؛ بعد از ادامه از seg.pos دوباره درخواست می‌دهیم
+            if self.control.wait_running() == CANCELLED:
+                return False
+
+    def same_file(self, r, seg):
+        # Mirror باید همان فایل را با همان اندازه داشته باشد
+        spec, _, total = r.headers.get("Content-Range", "").rpartition("/")
+        if total.isdigit() and int(total) != self.table.filesize:
+            return False
+        # بازه‌ای غیر از آنچه خواستیم داده را جای اشتباه می‌نویسد
+        start = spec.rpartition(" ")[2].partition("-")[0]
+        return r.status_code != 206 or not start.isdigit() or int(start) == seg.pos
+
+    def fetch_range(self, seg, mirror):
+        headers = {"Range": f"bytes={seg.pos}-{seg.end}"}
+        # فقط لینک اصلی؛ validator مال همان سرور است
+        primary = mirror.url == self.journal.url
+        if primary and self.journal.validator:
+            # اگر فایل عوض شده باشد سرور به جای 206 کل نسخه‌ی جدید را با 200 می‌فرستد
+            headers["If-Range"] = self.journal.validator
+        host = host_of(mirror.url)
+        sent = time.monotonic()
+        with net.get(mirror.url, headers=headers, stream=True, timeout=10) as r:
+            started = time.monotonic()
+            metrics.TTFB.observe(host, value=started - sent)
+            metrics.REQUESTS.inc(host, str(r.status_code))
+            if r.status_code in net.RETRY_STATUSES:
+                raise net.TransientHTTPError(r)
+            if primary and (r.status_code == 416 or r.status_code == 200 and "If-Range" in headers):
+                # 416: فایل کوتاه‌تر شده؛ 200 با If-Range: نسخه‌ی دیگری است. ادامه یعنی فایل خراب
+                self.table.stale = True
+                return False
+            if r.status_code != 206 and not (r.status_code == 200 and seg.pos == 0) or not self.same_file(r, seg):
+                if self.mirrors.failed(mirror):
+                    return SWITCH_MIRROR
+                self.parent_item.update_status(f"❌ خطا HTTP {r.status_code}")
+                return False
+            start = seg.pos
+            # پاسخ تا کجا می‌رود؛ seg.end ممکن است با دزدیدن تکه کوتاه‌تر شود
+            last = seg.end if r.status_code == 206 else self.table.filesize - 1
+            reader = ChunkReader(r, allocate=False)
+            sampler = MirrorSampler(self.mirrors, mirror)
+            try:
+                result = self.receive(seg, mirror, reader, sampler)
+                if result is True:
+                    self.drain(reader, last - seg.end)
+                return result
+            finally:
+                record_range(host, seg.pos - start, time.monotonic() - started, reader.stalls)
+
+    def receive(self, seg, mirror, reader, sampler):
+        while not seg.is_done():
+            if self.retiring or self.table.stale:
+                # بقیه‌ی تکه بی‌صاحب می‌شود و Worker دیگری آن را از seg.pos برمی‌دارد
+                return False
+            if self.control.state != RUNNING:
+                state = self.control.wait_running(RELEASE_AFTER)
+                if state != RUNNING:
+                    return False if state == CANCELLED else PAUSED
+                sampler.restart()
+            if mirror.dropped:
+                return SWITCH_MIRROR
+            # اگر صف نوشتن پر باشد همین‌جا می‌ایستیم، نه وسط نوشتن روی دیسک
+            buf = self.sink.acquire_buffer()
+            # بافر مال pool مشترک همه‌ی دانلودهاست؛ تا sink.write مالکیت را بگیرد، هر خطایی باید آن را برگرداند
+            try:
+                n = reader.readinto(buf)
+                if n == 0:
+                    # سرور قبل از پایان تکه اتصال را بست؛ fetch_segment از seg.pos ادامه می‌دهد
+                    raise ConnectionError("اتصال قبل از پایان تکه بسته شد")
+                # ممکن است انتهای تکه را کسی دزدیده باشد
+                n = min(n, seg.remaining())
+                if self.verifier:
+                    # هش همان موقع از بافر حساب می‌شود تا بعد از دانلود فایل دوباره خوانده نشود
+                    self.verifier.feed(seg.pos, memoryview(buf)[:n])
+            except BaseException:
+                self.sink.release_buffer(buf)
+                raise
+            self.sink.write(seg.pos, buf, n)
+            seg.pos += n
+            self.counter.add(n)
+            sampler.add(n)
+            self.journal.maybe_flush()
+            # مکث را بالای حلقه رسیدگی می‌کنیم
+            if self.throttle.consume(n) == CANCELLED:
+                return False
+        return True
+
+    def drain(self, reader, leftover):
+        # ChunkReader فقط با رسیدن به EOF اتصال را به pool برمی‌گرداند؛ وگرنه with آن را می‌بندد
+        if leftover > DRAIN_LIMIT:
+            return
+        scratch = bytearray(MIN_CHUNK)
+        try:
+            while reader.readinto(scratch):
+                pass
+        except net.NETWORK_ERRORS:
+            # تکه کامل شده؛ فقط اتصال از دست رفت
+            pass
+
+
+class Download:
+    # موتور دانلود بدون رابط کاربری؛ W.py و T.py فقط وضعیت آن را نمایش می‌دهند
+    def __init__(self, url, dest_dir, checksum=None):
+        # url می‌تواند یک لینک یا فهرست لینک‌های هم‌ارز (Mirror) باشد؛ اولی هویت دانلود است
+        self.urls = [url] if isinstance(url, str) else list(url)
+        self.url = self.urls[0]
+        self.mirrors = None
+        # هش مورد انتظار، لینک فایل checksum یا لینک metalink
+        self.checksum_spec = checksum
+        self.checksum = None
+        self.local_filename = self.url.split("/")[-1].split("?")[0]
+        self.dest_dir = dest_dir
+        self.filepath = os.path.join(dest_dir, self.local_filename)
+        self.filesize = 0
+        self.etag = None
+        self.last_modified = None
+        self.validator = None
+        # Download کامل‌شده‌ای با همین لینک که نتیجه‌اش کپی می‌شود (start_from)
+        self.source = None
+        self.is_downloading = False
+        self.completed = False
+        self.status_text = "در انتظار"
+        self.workers = []
+        self.priority = 0
+        self.is_queued = False
+        self.on_finished = None
+
+    meter = _lazy("_meter", ProgressMeter)
+    control = _lazy("_control", DownloadControl)
+    bucket = _lazy("_bucket", TokenBucket)
+    done = _lazy("_done", threading.Event)
+
+    @property
+    def is_paused(self):
+        control = self.__dict__.get("_control")
+        return control is not None and control.state == PAUSED
+
+    @property
+    def is_cancelled(self):
+        control = self.__dict__.get("_control")
+        return control is not None and control.state == CANCELLED
+
+    @property
+    def failed(self):
+        # اجرا شده و تمام شده، ولی نه کامل و نه لغو
+        done = self.__dict__.get("_done")
+        return done is not None and done.is_set() and not self.completed and not self.is_cancelled
+
+    @property
+    def state(self):
+        # یکی از search.STATUSES به جز "all"؛ برای فیلتر و ذخیره‌ی صف
+        if self.completed:
+            return "completed"
+        if self.is_cancelled:
+            return "cancelled"
+        if self.is_downloading:
+            return "active"
+        if self.failed:
+            return "failed"
+        return "queued"
+
+    def toggle_pause(self):
+        if not self.is_downloading:
+            return
+        if self.is_paused:
+            self.control.resume()
+        else:
+            self.control.pause()
+        self.update_status("⏸ متوقف شده" if self.is_paused else "⬇️ در حال دانلود")
+
+    def cancel(self):
+        if not self.is_downloading:
+            return False
+        self.control.cancel()
+        self.update_status("لغو شد")
+        return True
+
+    def set_dest_dir(self, dest_dir):
+        # فقط قبل از شروع دانلود معنی دارد
+        self.dest_dir = dest_dir
+        self.filepath = os.path.join(dest_dir, self.local_filename)
+
+    def set_speed_limit(self, rate):
+        self.bucket.set_rate(rate)
+
+    def update_status(self, text):
+        # از Threadهای دانلود صدا زده می‌شود؛ نمایش با نرخ ثابت آن را می‌خواند
+        self.status_text = text
+
+    @property
+    def downloaded_bytes(self):
+        return self.meter.total()
+
+    def start(self):
+        self.done.clear()
+        threading.Thread(target=self.run_download, daemon=True).start()
+
+    def run_download(self):
+        try:
+            self.download()
+        finally:
+            cache.release(self)
+            metrics.DOWNLOADS.inc("completed" if self.completed else "cancelled" if self.is_cancelled else "failed")
+            # بعضی مسیرهای خطا (مثل HTTP غیر 200 در دانلود تک‌رشته‌ای) زودتر برمی‌گردند
+            self.is_downloading = False
+            self.is_queued = False
+            # جا را در زمان‌بند برای دانلود بعدی آزاد می‌کنیم
+            if self.on_finished:
+                self.on_finished(self)
+            self.done.set()
+
+    def download(self):
+        os.makedirs(self.dest_dir, exist_ok=True)
+        self.control.start()
+        self.is_downloading = True
+        self.completed = False
+        self.meter.reset()
+        self.mirrors = MirrorSet(self.urls)
+
+        try:
+            if self.source is not None:
+                self.copy_from(self.source)
+                return
+            # بدون زمان‌بند (مثل T2.py) همین‌جا؛ همزمان با HEAD اتصال‌های Workerها باز می‌شوند
+            net.prewarm(self.url)
+            self.filepath = cache.claim(self, os.path.join(self.dest_dir, self.local_filename))
+            cached = cache.lookup(self.url)
+            # بدون نسخه‌ی قبلی، نتیجه‌ی بررسی همزمان صف (probe.prober) جای HEAD را می‌گیرد
+            r = None if cached else prober.take(self.url)
+            if r is None or r.status_code >= 400:
+                r = self.probe(cache.conditional_headers(cached) if cached else None)
+            if r.status_code == 304:
+                # بدون تغییر از دانلود قبلی؛ هزینه فقط یک رفت و برگشت است
+                copy_result(cached["filepath"], self.filepath)
+                self.etag, self.last_modified = cached["etag"], cached["last_modified"]
+                self.finish_from(cached["filesize"], "✅ بدون تغییر")
+                # نسخه‌ی کپی‌شده هم مال این لینک است؛ دانلود بعدی در همین پوشه آن را بازنویسی می‌کند
+                cache.store(self)
+                return
+            self.checksum = load_checksum(self.checksum_spec, self.local_filename)
+            for restart in range(MAX_RESTARTS + 1):
+                if restart:
+                    # بخش‌های نوشته‌شده مال نسخه‌ی قبلی بودند؛ با اندازه و validator تازه از اول
+                    self.update_status("🔁 فایل روی سرور عوض شده؛ دانلود از اول")
+                    self.meter.reset()
+                    r = self.probe()
+                self.filesize = int(r.headers.get("Content-Length", 0))
+                self.etag = r.headers.get("ETag")
+                self.last_modified = r.headers.get("Last-Modified")
+                self.validator = resume_validator(r.headers)
+                accept_ranges = r.headers.get("Accept-Ranges", "none")
+                if accept_ranges != "bytes" or self.filesize == 0:
+                    # دانلود ساده در یک رشته
+                    self.download_single_thread()
+                    break
+                if not self.download_multi_thread():
+                    break
+            else:
+                self.update_status("❌ فایل روی سرور مدام عوض می‌شود")
+                self.is_downloading = False
+            if self.completed:
+                cache.store(self)
+        except Exception as e:
+            self.update_status(f"❌ خطا: {str(e)}")
+            self.is_downloading = False
+
+    def start_from(self, leader):
+        # زمان‌بند لینک‌های تکراری را یکی می‌کند؛ بعد از کامل شدن اولی بقیه فقط کپی می‌شوند
+        self.source = leader
+        self.start()
+
+    def copy_from(self, leader):
+        self.source = None
+        if self.dest_dir == leader.dest_dir:
+            self.filepath = leader.filepath
+        else:
+            self.filepath = cache.claim(self, os.path.join(self.dest_dir, self.local_filename))
+            copy_result(leader.filepath, self.filepath)
+        self.etag, self.last_modified = leader.etag, leader.last_modified
+        self.finish_from(leader.filesize, "✅ کامل شد")
+        cache.store(self)
+
+    def finish_from(self, filesize, status):
+        self.filesize = filesize
+        self.meter.reset(filesize)
+        self.update_status(status)
+        self.completed = True
+        self.is_downloading = False
+
+    def probe(self, headers=None):
+        # اولین Mirror که جواب بدهد اندازه و پشتیبانی Range را مشخص می‌کند.
+        # درخواست شرطی فقط به لینک اصلی؛ ETag روی Mirrorهای دیگر فرق دارد
+        for mirror in self.mirrors.alive():
+            try:
+                r = net.head(mirror.url, allow_redirects=True, headers=headers if mirror.url == self.url else None)
+            except net.NETWORK_ERRORS:
+                if not self.mirrors.failed(mirror):
+                    raise
+                continue
+            if r.status_code < 400 or not self.mirrors.failed(mirror):
+                return r
+
+    def download_single_thread(self):
+        throttle = Throttle(global_bucket, self.bucket, control=self.control)
+        counter = self.meter.new_counter()
+        hasher = hashlib.new(self.checksum.algo) if self.checksum and self.checksum.digest else None
+        url = self.mirrors.alive()[0].url
+        host = host_of(url)
+        started = None
+        try:
+            sent = time.monotonic()
+            with net.get(url, stream=True) as r:
+                started = time.monotonic()
+                metrics.TTFB.observe(host, value=started - sent)
+                metrics.REQUESTS.inc(host, str(r.status_code))
+                if r.status_code != 200:
+                    self.update_status(f"❌ خطا HTTP {r.status_code}")
+                    return
+                with open(self.filepath, "wb") as f:
+                    for chunk in iter_chunks(r):
+                        # فایل بدون Range قابل ادامه نیست، پس اتصال را نگه می‌داریم
+                        if self.control.state != RUNNING and self.control.wait_running() == CANCELLED:
+                            return
+                        if chunk:
+                            f.write(chunk)
+                            if hasher:
+                                hasher.update(chunk)
+                            counter.add(len(chunk))
+                            if throttle.consume(len(chunk)) == CANCELLED:
+                                return
+            if hasher and hasher.hexdigest() != self.checksum.digest:
+                self.update_status("❌ هش فایل مطابقت ندارد")
+                self.is_downloading = False
+                return
+            self.update_status("✅ کامل شد")
+            self.completed = True
+            self.is_downloading = False
+        except Exception as e:
+            self.update_status(f"❌ خطا: {str(e)}")
+            self.is_downloading = False
+        finally:
+            if started is not None:
+                record_range(host, counter.value, time.monotonic() - started)
+
+    def add_worker(self, table, journal, sink, verifier, force=False):
+        if not net.connection_budget.acquire(force):
+            return False
+        worker = DownloadWorker(self.mirrors, table, journal, sink, self, len(self.workers), verifier)
+        worker.slot = True
+        self.workers.append(worker)
+        worker.start()
+        return True
+
+    def run_workers(self, table, journal, sink, verifier):
+        self.workers = []
+        pending = sum(1 for seg in table.segments if not seg.is_done())
+        for i in range(max(1, min(INITIAL_THREADS, pending))):
+            # اولین اتصال همیشه، حتی وقتی سقف کل پر است؛ وگرنه دانلود هیچ‌وقت شروع نمی‌شود
+            self.add_worker(table, journal, sink, verifier, force=i == 0)
+
+        # منتظر می‌مونیم همه Threadها تموم شن و در این فاصله تعداد اتصال‌ها را با سرعت تنظیم می‌کنیم
+        tuner = ConnectionTuner(MAX_THREADS_PER_DOWNLOAD)
+        last_total, last_time = self.meter.total(), time.monotonic()
+        retired = False
+        while True:
+            alive = [w for w in self.workers if w.is_alive()]
+            active = [w for w in alive if not w.retiring]
+            if not active:
+                for w in alive:
+                    w.join()
+                # تکه‌ی Worker کنارگذاشته‌شده اگر برای دزدیدن کوچک بود، بعد از رفتن بقیه بی‌صاحب مانده
+                if retired and not table.is_complete() and not table.stale and not self.is_cancelled:
+                    retired = False
+                    self.add_worker(table, journal, sink, verifier, force=True)
+                    continue
+                break
+            active[0].join(PROBE_INTERVAL)
+            total, now = self.meter.total(), time.monotonic()
+            if self.control.state != RUNNING:
+                # مکث یا محدودیت دستی؛ بعد از ادامه از نو اندازه می‌گیریم
+                last_total, last_time = total, now
+                tuner.changed()
+                continue
+            if now - last_time < PROBE_INTERVAL:
+                continue
+            delta = tuner.decide((total - last_total) / (now - last_time), len(active))
+            last_total, last_time = total, now
+            if delta > 0:
+                added = 0
+                while added < delta and table.has_spare_work() and self.add_worker(table, journal, sink, verifier):
+                    added += 1
+                if added:
+                    tuner.changed()
+                else:
+                    tuner.rejected()
+            elif delta < 0:
+                for worker in active[delta:]:
+                    worker.retiring = True
+                retired = True
+                tuner.changed()
+
+        for w in self.workers:
+            w.join()
+
+    def refetch_bad_pieces(self, table, verifier):
+        # فقط پیس‌های خراب به جدول برمی‌گردند؛ بقیه‌ی فایل دست نمی‌خورد
+        bad = verifier.finish()
+        if bad:
+            metrics.RETRIES.inc(host_of(self.url), "piece", amount=len(bad))
+        for index in bad:
+            start, end = verifier.piece_range(index)
+            table.add_range(start, end)
+            self.meter.base -= end - start + 1
+        verifier.reset(bad)
+        return bad
+
+    def download_multi_thread(self):
+        # True یعنی فایل روی سرور وسط کار عوض شد و باید از اول شروع شود
+        checksum = self.checksum
+        # با هش هر پیس (metalink) مرز تکه‌ها روی مرز پیس‌ها می‌افتد تا هر پیس را یک Worker بگیرد
+        verifier_needed = checksum is not None and checksum.pieces is not None
+        align = checksum.piece_size if verifier_needed else 1
+        journal = ResumeJournal(self.filepath, self.url, self.filesize, self.validator)
+        ranges = journal.load()
+        if ranges:
+            # ادامه از همان بازه‌هایی که قبلا کامل شده‌اند؛ If-Range هر درخواست نسخه را دوباره چک می‌کند
+            table = SegmentTable.from_ranges(self.filesize, ranges, align=align)
+            self.meter.reset(self.filesize - table.remaining())
+        else:
+            table = SegmentTable(self.filesize, INITIAL_THREADS, align=align)
+        # یک fd مشترک با پیش‌تخصیص کامل فایل؛ نوشتن در Thread جدا انجام می‌شود
+        sink = DiskSink(self.filepath, self.filesize, fresh=not ranges)
+        verifier = PieceVerifier(checksum, self.filesize, sink.fd) if verifier_needed else None
+        hasher = None
+        if checksum is not None and checksum.digest and not verifier_needed:
+            # فقط هش کل فایل داریم؛ Thread نویسنده آن را به ترتیب offset حساب می‌کند
+            hasher = StreamHasher(checksum, sink.fd)
+            if ranges:
+                hasher.resume(ranges)
+            sink.on_written = hasher.on_written
+        journal.attach(table, sink)
+
+        bad = []
+        try:
+            for _ in range(MAX_VERIFY_ROUNDS):
+                self.run_workers(table, journal, sink, verifier)
+                if verifier is None or not table.is_complete() or self.is_cancelled:
+                    break
+                sink.drain()
+                bad = self.refetch_bad_pieces(table, verifier)
+                if not bad:
+                    break
+                self.update_status(f"🔁 دریافت دوباره‌ی {len(bad)} پیس خراب")
+        except OSError as e:
+            self.update_status(f"❌ خطا: {str(e)}")
+
+        if table.stale:
+            # صدا زننده دوباره از اول شروع می‌کند
+            sink.close()
+            journal.remove()
+            return True
+
+        complete = table.is_complete()
+        try:
+            if complete:
+                sink.drain()
+                journal.remove()
+                if hasher and not hasher.finish(self.filesize):
+                    # بدون هش پیس‌ها نمی‌شود فهمید کدام بخش خراب است
+                    self.update_status("❌ هش فایل مطابقت ندارد")
+                    complete = False
+            else:
+                if bad:
+                    self.update_status("❌ هش پیس‌ها بعد از چند بار تلاش مطابقت ندارد")
+                journal.flush()
+        except OSError as e:
+            self.update_status(f"❌ خطا: {str(e)}")
+            complete = False
+        finally:
+            sink.close()
+
+        if complete and not self.is_cancelled:
+            self.update_status("✅ کامل شد")
+            self.completed = True
+        self.is_downloading = False
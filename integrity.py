@@ -0,0 +1,228 @@
+import hashlib
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+
+import net
+
+HASH_BY_LENGTH = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+READ_BLOCK = 1024 * 1024
+METALINK_NS = "{urn:ietf:params:xml:ns:metalink}"
+
+
+class Checksum:
+    def __init__(self, algo, digest=None, piece_size=0, pieces=None):
+        self.algo = algo
+        self.digest = digest.lower() if digest else None
+        self.piece_size = piece_size
+        self.pieces = [p.lower() for p in pieces] if pieces else None
+
+
+def _algo_name(name):
+    # "SHA-256" در متالینک همان "sha256" در hashlib است
+    return name.lower().replace("-", "")
+
+
+def parse_expected_hash(text):
+    # "sha256:hex"، "sha256=hex" یا فقط hex که نوعش از طولش معلوم است
+    text = text.strip()
+    m = re.match(r"^([A-Za-z0-9-]+)[:=]([0-9a-fA-F]+)$", text)
+    if m:
+        return Checksum(_algo_name(m.group(1)), m.group(2))
+    if re.match(r"^[0-9a-fA-F]+$", text) and len(text) in HASH_BY_LENGTH:
+        return Checksum(HASH_BY_LENGTH[len(text)], text)
+    raise ValueError(f"هش نامعتبر: {text}")
+
+
+def parse_checksum_file(text, filename):
+    # قالب sha256sum ("hex  name") و قالب BSD ("SHA256 (name) = hex")
+    for line in text.splitlines():
+        line = line.strip()
+        m = re.match(r"^([0-9a-fA-F]+)\s+\*?(.+)$", line)
+        if m and os.path.basename(m.group(2).strip()) == filename and len(m.group(1)) in HASH_BY_LENGTH:
+            return Checksum(HASH_BY_LENGTH[len(m.group(1))], m.group(1))
+        m = re.match(r"^([A-Za-z0-9-]+)\s*\((.+)\)\s*=\s*([0-9a-fA-F]+)$", line)
+        if m and os.path.basename(m.group(2)) == filename:
+            return Checksum(_algo_name(m.group(1)), m.group(3))
+    # فایل تک‌خطی بدون نام فایل، مثل file.iso.sha256
+    words = text.split()
+    if len(words) == 1:
+        return parse_expected_hash(words[0])
+    raise ValueError(f"هشی برای {filename} پیدا نشد")
+
+
+def parse_metalink(text, filename):
+    root = ET.fromstring(text)
+    for node in root.iter(METALINK_NS + "file"):
+        if node.get("name") and os.path.basename(node.get("name")) != filename:
+            continue
+        digest = algo = None
+        for h in node.findall(METALINK_NS + "hash"):
+            name = _algo_name(h.get("type", ""))
+            if name in hashlib.algorithms_available:
+                algo, digest = name, h.text.strip()
+                break
+        piece_size, pieces = 0, None
+        p = node.find(METALINK_NS + "pieces")
+        if p is not None and _algo_name(p.get("type", "")) in hashlib.algorithms_available:
+            piece_size = int(p.get("length"))
+            pieces = [h.text.strip() for h in p.findall(METALINK_NS + "hash")]
+            if algo is None:
+                algo = _algo_name(p.get("type"))
+        if algo is None:
+            break
+        checksum = Checksum(algo, digest, piece_size, pieces)
+        if pieces and algo != _algo_name(p.get("type")):
+            # پیس‌ها نوع خودشان را دارند؛ هش کل فایل در این حالت لازم نیست
+            checksum = Checksum(_algo_name(p.get("type")), None, piece_size, pieces)
+        return checksum
+    raise ValueError(f"هشی برای {filename} در metalink پیدا نشد")
+
+
+def load_checksum(spec, filename):
+    # spec می‌تواند خود هش، لینک فایل checksum یا لینک .meta4 باشد
+    if not spec:
+        return None
+    spec = spec.strip()
+    if not re.match(r"^https?://", spec):
+        return parse_expected_hash(spec)
+    r = net.get(spec, timeout=10)
+    r.raise_for_status()
+    text = r.text
+    if spec.split("?")[0].endswith((".meta4", ".metalink")) or text.lstrip().startswith("<?xml"):
+        return parse_metalink(text, filename)
+    return parse_checksum_file(text, filename)
+
+
+def _pread(fd, size, offset):
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+class PieceVerifier:
+    # هر پیس کاملا داخل یک تکه است (SegmentTable با align ساخته می‌شود)، پس به ترتیب می‌رسد
+    def __init__(self, checksum, filesize, fd):
+        self.algo = checksum.algo
+        self.piece_size = checksum.piece_size
+        self.expected = checksum.pieces
+        self.filesize = filesize
+        self.fd = fd
+        self.lock = threading.Lock()
+        self.hashers = {}
+        self.verified = set()
+        self.bad = set()
+
+    def piece_range(self, index):
+        start = index * self.piece_size
+        return start, min(start + self.piece_size, self.filesize) - 1
+
+    def feed(self, offset, data):
+        while data:
+            index = offset // self.piece_size
+            start, end = self.piece_range(index)
+            state = self.hashers.get(index)
+            if state is None:
+                state = [hashlib.new(self.algo), start]
+                if offset > start:
+                    # ادامه بعد از ری‌استارت: ابتدای پیس قبلا روی دیسک نوشته شده
+                    self._hash_from_disk(state[0], start, offset - start)
+                    state[1] = offset
+                self.hashers[index] = state
+            n = min(len(data), end - offset + 1)
+            state[0].update(data[:n])
+            state[1] += n
+            if state[1] > end:
+                self._check(index, state[0].hexdigest())
+                del self.hashers[index]
+            data = data[n:]
+            offset += n
+
+    def _hash_from_disk(self, hasher, offset, size):
+        while size > 0:
+            block = _pread(self.fd, min(READ_BLOCK, size), offset)
+            if not block:
+                break
+            hasher.update(block)
+            offset += len(block)
+            size -= len(block)
+
+    def _check(self, index, digest):
+        with self.lock:
+            if digest == self.expected[index]:
+                self.verified.add(index)
+                self.bad.discard(index)
+            else:
+                self.bad.add(index)
+
+    def finish(self):
+        # پیس‌هایی که در این اجرا دریافت نشدند (مثلا قبل از ری‌استارت کامل شده بودند) از دیسک چک می‌شوند
+        for index in range(len(self.expected)):
+            if index in self.verified or index in self.bad:
+                continue
+            start, end = self.piece_range(index)
+            hasher = hashlib.new(self.algo)
+            self._hash_from_disk(hasher, start, end - start + 1)
+            self._check(index, hasher.hexdigest())
+        self.hashers.clear()
+        return sorted(self.bad)
+
+    def reset(self, indexes):
+        with self.lock:
+            for index in indexes:
+                self.bad.discard(index)
+                self.verified.discard(index)
+
+
+class StreamHasher:
+    # هش کل فایل به ترتیب؛ داده‌ی در ترتیب از حافظه، بقیه همان موقع از page cache خوانده می‌شود.
+    # فقط از Thread نویسنده‌ی storage صدا زده می‌شود.
+    def __init__(self, checksum, fd):
+        self.hasher = hashlib.new(checksum.algo)
+        self.expected = checksum.digest
+        self.fd = fd
+        self.cursor = 0
+        # بازه‌های نوشته‌شده‌ی جلوتر از cursor؛ بازه‌های پشت سر هم یکی می‌شوند
+        self.pending = {}
+        self.ends = {}
+
+    def on_written(self, offset, data):
+        if offset == self.cursor:
+            self.hasher.update(data)
+            self.cursor += len(data)
+        elif offset > self.cursor:
+            self._add(offset, offset + len(data))
+        self._catch_up()
+
+    def resume(self, ranges):
+        # ادامه‌ی دانلود: بازه‌های کامل ژورنال (start, pos, end) از قبل روی دیسک‌اند.
+        # پیشوند کامل همین حالا خوانده می‌شود و بقیه وقتی cursor به آن‌ها برسد؛ قبل از وصل شدن به sink صدا زده شود
+        for start, pos, _ in sorted(ranges):
+            if pos > start:
+                self._add(start, pos)
+        self._catch_up()
+
+    def _add(self, start, end):
+        start = self.ends.pop(start, start)
+        self.pending[start] = end
+        self.ends[end] = start
+
+    def _catch_up(self):
+        while self.cursor in self.pending:
+            end = self.pending.pop(self.cursor)
+            self.ends.pop(end, None)
+            while self.cursor < end:
+                block = _pread(self.fd, min(READ_BLOCK, end - self.cursor), self.cursor)
+                if not block:
+                    return
+                self.hasher.update(block)
+                self.cursor += len(block)
+
+    def finish(self, filesize):
+        # هر چه هنوز به cursor نرسیده (مثلا نوشتن‌های ناموفق) از دیسک خوانده می‌شود
+        self.pending = {self.cursor: filesize}
+        self.ends = {}
+        self._catch_up()
+        return self.hasher.hexdigest() == self.expected
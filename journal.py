@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+JOURNAL_SUFFIX = ".idm"
+FLUSH_INTERVAL = 2.0
+
+
+def resume_validator(headers):
+    # مقدار If-Range: ETag قوی، وگرنه Last-Modified (ETag ضعیف W/ در If-Range مجاز نیست)
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+class ResumeJournal:
+    def __init__(self, filepath, url, filesize, validator=None):
+        self.filepath = filepath
+        self.path = filepath + JOURNAL_SUFFIX
+        self.url = url
+        self.filesize = filesize
+        # نسخه‌ی فایل روی سرور؛ اگر عوض شده باشد ادامه دادن یعنی فایل خراب
+        self.validator = validator
+        self.table = None
+        self.sink = None
+        self.lock = threading.Lock()
+        self.last_flush = time.time()
+
+    def load(self):
+        # فقط وقتی ادامه می‌دهیم که هم ژورنال و هم فایل با همین لینک و اندازه بخوانند
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("url") != self.url or data.get("filesize") != self.filesize:
+                return None
+            if data.get("validator") and self.validator and data["validator"] != self.validator:
+                return None
+            if os.path.getsize(self.filepath) != self.filesize:
+                return None
+            return data["segments"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def attach(self, table, sink=None):
+        self.table = table
+        self.sink = sink
+        self.last_flush = time.time()
+
+    def maybe_flush(self):
+        # از Thread سوکت؛ با sink فقط یک checkpoint در صف نوشتن می‌گذارد و fsync را Thread نویسنده انجام می‌دهد
+        if time.time() - self.last_flush < FLUSH_INTERVAL:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if self.sink is None:
+                self._write()
+                return
+            self.last_flush = time.time()
+            # موقعیت‌ها فقط بایت‌هایی را نشان می‌دهند که قبل از این checkpoint در صف نوشتن رفته‌اند
+            segments = self.table.snapshot()
+            self.sink.checkpoint(lambda: self._commit(segments))
+        finally:
+            self.lock.release()
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        self.last_flush = time.time()
+        segments = self.table.snapshot()
+        # اول داده روی دیسک، بعد ژورنال؛ وگرنه ژورنال بایت‌هایی را ثبت می‌کند که هنوز نوشته نشده‌اند
+        if self.sink is not None:
+            self.sink.sync()
+            self._save(segments)
+        else:
+            self._commit(segments)
+
+    def _commit(self, segments):
+        if self.sink is not None:
+            # در Thread نویسنده؛ sink.sync اینجا منتظر خودش می‌ماند
+            os.fsync(self.sink.fd)
+        else:
+            fd = os.open(self.filepath, os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._save(segments)
+
+    def _save(self, segments):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"url": self.url, "filesize": self.filesize, "validator": self.validator,
+                       "segments": segments}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,86 @@
+import customtkinter as ctk
+
+# ارتفاع هر ردیف؛ تعداد ردیف‌های ساخته‌شده از روی ارتفاع قاب حساب می‌شود
+ROW_HEIGHT = 90
+WHEEL_ROWS = 3
+
+
+class VirtualList(ctk.CTkFrame):
+    # فقط ردیف‌های قابل دیدن ویجت دارند؛ با اسکرول همان ردیف‌ها به مدل‌های دیگر وصل می‌شوند.
+    # make_row(master) باید ردیفی با attach(model) و refresh() بسازد.
+    def __init__(self, master, make_row, row_height=ROW_HEIGHT, **kwargs):
+        super().__init__(master, **kwargs)
+        self.make_row = make_row
+        self.row_height = row_height
+        self.models = []
+        self.first = 0
+        self.visible = 1
+        self.rows = []
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.body.grid_columnconfigure(0, weight=1)
+        self.body.grid_propagate(False)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.body.bind("<Configure>", self.on_resize)
+        # مثل CTkScrollableFrame؛ رویداد چرخ به ویجت زیر اشاره‌گر می‌رسد، نه به خود قاب
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind_all(sequence, self.on_wheel, add=True)
+
+    def set_models(self, models, top=False):
+        self.models = models
+        if top:
+            self.first = 0
+        self.render()
+
+    def on_resize(self, event):
+        self.visible = max(1, event.height // self.row_height)
+        while len(self.rows) < self.visible:
+            self.rows.append(self.make_row(self.body))
+        self.render()
+
+    def on_wheel(self, event):
+        if not str(event.widget).startswith(str(self)):
+            return
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first - WHEEL_ROWS)
+        else:
+            self.scroll_to(self.first + WHEEL_ROWS)
+
+    def on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self.models)))
+        elif unit == "pages":
+            self.scroll_to(self.first + int(value) * self.visible)
+        else:
+            self.scroll_to(self.first + int(value))
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.models) - self.visible))
+        if first != self.first:
+            self.first = first
+            self.render()
+
+    def render(self):
+        # هزینه‌ی هر بار فقط به تعداد ردیف‌های دیده‌شده بستگی دارد، نه به طول فهرست
+        count = len(self.models)
+        self.first = max(0, min(self.first, count - self.visible))
+        for i, row in enumerate(self.rows):
+            index = self.first + i
+            if i < self.visible and index < count:
+                row.attach(self.models[index])
+                if not row.winfo_manager():
+                    row.grid(row=i, column=0, sticky="ew", pady=3)
+            elif row.winfo_manager():
+                row.grid_forget()
+        if count:
+            self.scrollbar.set(self.first / count, min(1.0, (self.first + self.visible) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def refresh(self):
+        for row in self.rows[:self.visible]:
+            if row.winfo_manager():
+                row.refresh()
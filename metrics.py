@@ -0,0 +1,155 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# شمارنده‌ها در هر درخواست Range یا تکه یک بار به‌روز می‌شوند، نه در هر chunk
+TTFB_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+THROUGHPUT_BUCKETS = tuple(2 ** i * 1024 for i in range(6, 21, 2))  # 64KB/s تا 1GB/s
+SEGMENT_BYTES_BUCKETS = tuple(2 ** i * 1024 for i in range(6, 21, 2))  # 64KB تا 1GB
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return [{"labels": dict(zip(self.labels, k)), "value": v} for k, v in self.values.items()]
+
+    def prometheus(self):
+        with self.lock:
+            return [f"{self.name}{_label_text(self.labels, k)} {v}" for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=TTFB_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # به ازای هر برچسب: [شمارش هر سطل (غیرتجمعی) + سطل +Inf، جمع، تعداد]
+        self.values = {}
+
+    def observe(self, *labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [{"labels": dict(zip(self.labels, k)),
+                     "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], counts)),
+                     "sum": total, "count": count}
+                    for k, (counts, total, count) in self.values.items()]
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            for k, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, n in zip(list(self.buckets) + ["+Inf"], counts):
+                    cumulative += n
+                    le = _label_text(self.labels, k, [("le", bound)])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, k)} {total}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, k)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=TTFB_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def snapshot(self):
+        return {"time": time.time(),
+                "metrics": {m.name: {"type": m.kind, "help": m.help, "values": m.snapshot()}
+                            for m in self.metrics}}
+
+    def prometheus(self):
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.prometheus())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # .json یک snapshot کامل؛ بقیه قالب متنی Prometheus (برای textfile collector در node_exporter)
+        if path.endswith(".json"):
+            text = json.dumps(self.snapshot(), ensure_ascii=False, indent=1)
+        else:
+            text = self.prometheus()
+        # فایل نیمه‌نوشته هیچ‌وقت خوانده نمی‌شود
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+BYTES = registry.counter("idm_bytes_total", "Bytes received from each host", ("host",))
+REQUESTS = registry.counter("idm_requests_total", "HTTP GET requests sent, by host and status", ("host", "status"))
+TTFB = registry.histogram("idm_ttfb_seconds", "Time from sending a GET until response headers", ("host",))
+SEGMENT_THROUGHPUT = registry.histogram(
+    "idm_segment_throughput_bytes_per_second", "Throughput of one ranged request", ("host",), THROUGHPUT_BUCKETS)
+SEGMENT_BYTES = registry.histogram(
+    "idm_segment_bytes", "Bytes fetched by one ranged request", (), SEGMENT_BYTES_BUCKETS)
+SEGMENT_STEALS = registry.counter("idm_segment_steals_total", "Segments split by work stealing")
+RETRIES = registry.counter("idm_retries_total", "Requests repeated after a failure", ("host", "reason"))
+STALLS = registry.counter("idm_stalls_total", "Socket reads slower than chunkreader.STALL_TIME", ("host",))
+DOWNLOADS = registry.counter("idm_downloads_total", "Finished downloads by result", ("result",))
+QUEUE_DEPTH = registry.gauge("idm_queue_depth", "Downloads waiting in the scheduler")
+ACTIVE_DOWNLOADS = registry.gauge("idm_active_downloads", "Downloads running now")
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from progress import SPEED_SMOOTHING
+
+# هر Worker سرعت اتصال خودش را با این فاصله به Mirror گزارش می‌دهد
+SAMPLE_INTERVAL = 1.0
+# سرعت یک Mirror بعد از این تعداد نمونه قابل قضاوت است
+MIN_SAMPLES = 3
+# Mirrorی که سرعت هر اتصالش از این نسبتِ بهترین Mirror کمتر باشد کنار گذاشته می‌شود
+SLOW_MIRROR_RATIO = 0.25
+# fetch_range با این مقدار می‌گوید Mirror کنار رفته و تکه باید از Mirror دیگری ادامه پیدا کند
+SWITCH_MIRROR = "switch"
+
+
+class Mirror:
+    def __init__(self, url):
+        self.url = url
+        self.speed = 0.0
+        self.samples = 0
+        self.active = 0
+        self.errors = 0
+        self.dropped = False
+
+
+class MirrorSet:
+    # لینک‌های هم‌ارز یک فایل؛ هر تکه از Mirrorی گرفته می‌شود که الان سریع‌تر است
+    def __init__(self, urls):
+        self.lock = threading.Lock()
+        self.mirrors = [Mirror(url) for url in urls]
+
+    @property
+    def primary(self):
+        return self.mirrors[0].url
+
+    def alive(self):
+        with self.lock:
+            return [m for m in self.mirrors if not m.dropped]
+
+    def acquire(self):
+        # Mirrorهای امتحان‌نشده اول؛ بعد بیشترین سرعت به ازای هر اتصالِ اضافه
+        with self.lock:
+            alive = [m for m in self.mirrors if not m.dropped]
+            if not alive:
+                return None
+            best_speed = max((m.speed for m in alive if m.samples), default=0.0)
+
+            def score(m):
+                speed = m.speed if m.samples else best_speed or 1.0
+                return speed / (m.active + 1)
+
+            mirror = max(alive, key=score)
+            mirror.active += 1
+            return mirror
+
+    def release(self, mirror):
+        with self.lock:
+            mirror.active -= 1
+
+    def record(self, mirror, nbytes, elapsed):
+        if elapsed <= 0:
+            return
+        with self.lock:
+            speed = nbytes / elapsed
+            if mirror.samples:
+                mirror.speed = SPEED_SMOOTHING * speed + (1 - SPEED_SMOOTHING) * mirror.speed
+            else:
+                mirror.speed = speed
+            mirror.samples += 1
+            self._drop_slow()
+
+    def _drop_slow(self):
+        measured = [m for m in self.mirrors if not m.dropped and m.samples >= MIN_SAMPLES]
+        if len(measured) < 2:
+            return
+        best = max(m.speed for m in measured)
+        for m in measured:
+            if m.speed < best * SLOW_MIRROR_RATIO:
+                m.dropped = True
+
+    def failed(self, mirror):
+        # Mirror خراب کنار می‌رود، مگر آخرین Mirror باشد؛ False یعنی جایگزینی نماند
+        with self.lock:
+            mirror.errors += 1
+            if any(not m.dropped for m in self.mirrors if m is not mirror):
+                mirror.dropped = True
+                return True
+            return False
+
+
+class MirrorSampler:
+    # سرعت یک اتصال را در بازه‌های SAMPLE_INTERVAL به MirrorSet گزارش می‌دهد
+    __slots__ = ("mirrors", "mirror", "nbytes", "started")
+
+    def __init__(self, mirrors, mirror):
+        self.mirrors = mirrors
+        self.mirror = mirror
+        self.nbytes = 0
+        self.started = time.monotonic()
+
+    def restart(self):
+        # زمان مکث نباید Mirror را کند نشان دهد
+        self.nbytes = 0
+        self.started = time.monotonic()
+
+    def add(self, n):
+        self.nbytes += n
+        now = time.monotonic()
+        if now - self.started >= SAMPLE_INTERVAL:
+            self.mirrors.record(self.mirror, self.nbytes, now - self.started)
+            self.nbytes = 0
+            self.started = now
@@ -0,0 +1,179 @@
+import http.client
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+
+from resolver import resolver
+
+# سقف اتصال همزمان به هر میزبان؛ درخواست اضافه تا آزاد شدن یک اتصال صبر می‌کند
+MAX_CONNECTIONS_PER_HOST = 8
+MAX_HOST_POOLS = 32
+# سقف کل اتصال‌های دانلود در همه‌ی دانلودها؛ هر دانلود دست‌کم یک اتصال دارد حتی اگر سقف پر باشد
+MAX_TOTAL_CONNECTIONS = 16
+# وقتی دانلودی از یک میزبان وارد صف می‌شود این تعداد اتصال (DNS + TCP + TLS) از قبل باز می‌شود؛
+# هم‌اندازه‌ی engine.INITIAL_THREADS تا Workerهای اول اتصال آماده داشته باشند
+PREWARM_CONNECTIONS = 2
+# هر میزبان حداکثر یک بار در این بازه گرم می‌شود؛ افزودن هزار لینک از یک میزبان هزار بار اتصال باز نمی‌کند
+PREWARM_INTERVAL = 10.0
+PREWARM_THREADS = 4
+
+# پاسخ‌هایی که معمولا با کمی صبر درست می‌شوند
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class TransientHTTPError(requests.HTTPError):
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}", response=response)
+        # Retry-After به ثانیه؛ قالب تاریخ نادیده گرفته می‌شود
+        value = response.headers.get("Retry-After", "")
+        self.retry_after = int(value) if value.isdigit() else 0
+
+
+# خطاهایی که از سرور یا شبکه است، نه از دیسک؛ ChunkReader مستقیم از http.client یا از urllib3 می‌خواند
+NETWORK_ERRORS = (requests.RequestException, urllib3.exceptions.HTTPError, http.client.HTTPException,
+                  ConnectionError, TimeoutError)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class ConnectionBudget:
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, force=False):
+        with self.lock:
+            if not force and self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.used -= 1
+
+
+connection_budget = ConnectionBudget(MAX_TOTAL_CONNECTIONS)
+
+
+class CachedDNSMixin:
+    # به جای getaddrinfo در هر اتصال تازه، آدرس از resolver خوانده می‌شود؛ Host و SNI همان نام میزبان می‌مانند
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = resolver.resolve(host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+        finally:
+            self._dns_host = host
+        # شاید آدرس‌ها عوض شده باشند؛ دفعه‌ی بعد دوباره پرس‌وجو می‌شود
+        resolver.forget(host, self.port)
+        raise error
+
+
+class CachedDNSConnection(CachedDNSMixin, HTTPConnection):
+    pass
+
+
+class CachedDNSHTTPSConnection(CachedDNSMixin, HTTPSConnection):
+    pass
+
+
+class CachedDNSPool(HTTPConnectionPool):
+    ConnectionCls = CachedDNSConnection
+
+
+class CachedDNSHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+
+class CachedDNSAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CachedDNSPool, "https": CachedDNSHTTPSPool}
+
+
+def get_session():
+    # یک Session مشترک برای همه‌ی دانلودها تا اتصال‌های keep-alive دوباره استفاده شوند
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = CachedDNSAdapter(pool_connections=MAX_HOST_POOLS,
+                                           pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+                                           pool_block=True)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def get(url, **kwargs):
+    return get_session().get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    return get_session().head(url, **kwargs)
+
+
+_warmed = {}
+_warm_lock = threading.Lock()
+_warmer = ThreadPoolExecutor(max_workers=PREWARM_THREADS)
+
+
+def prewarm(url, count=PREWARM_CONNECTIONS):
+    # بلافاصله برمی‌گردد؛ اتصال‌ها در پس‌زمینه باز می‌شوند و در pool مشترک می‌مانند
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    now = time.monotonic()
+    with _warm_lock:
+        last = _warmed.get(key)
+        if last is not None and now - last < PREWARM_INTERVAL:
+            return
+        _warmed[key] = now
+    _warmer.submit(_prewarm, url, count)
+
+
+def _prewarm(url, count):
+    try:
+        request = requests.Request("HEAD", url).prepare()
+        # همان pool که درخواست‌های Session برای این لینک از آن استفاده می‌کنند
+        pool = get_session().get_adapter(url).get_connection_with_tls_context(request, True)
+    except Exception:
+        return
+    conns = []
+    try:
+        for _ in range(count):
+            # اتصال‌های آزاد موجود اول برمی‌گردند و فقط کمبود باز می‌شود؛ اگر همه دست Workerها است گرم کردن لازم نیست
+            conns.append(pool._get_conn(timeout=0))
+    except urllib3.exceptions.EmptyPoolError:
+        pass
+    try:
+        for conn in conns:
+            if conn.sock is None:
+                conn.connect()
+    except Exception:
+        pass
+    finally:
+        for conn in conns:
+            pool._put_conn(conn)
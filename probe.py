@@ -0,0 +1,154 @@
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from requests.structures import CaseInsensitiveDict
+
+import net
+
+# بررسی اندازه و Range لینک‌ها قبل از دانلود؛ برای صف‌های چندهزارتایی همزمان، ولی با سقف برای هر میزبان
+MAX_PROBE_THREADS = 32
+MAX_PROBES_PER_HOST = 4
+PROBE_TIMEOUT = 10
+# نتیجه‌ی هر (میزبان، مسیر) این‌قدر معتبر است؛ دانلود واقعی آن را یک بار مصرف می‌کند
+PROBE_TTL = 300.0
+# بعضی سرورها HEAD را رد می‌کنند یا اندازه/Accept-Ranges را فقط در GET می‌فرستند
+HEAD_REJECTED = (403, 405, 501)
+
+
+class ProbeResult:
+    # مثل پاسخ requests (status_code و headers) تا engine بتواند به جای HEAD از آن استفاده کند
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+        self.time = time.monotonic()
+
+    @property
+    def filesize(self):
+        return int(self.headers.get("Content-Length", 0))
+
+    @property
+    def accept_ranges(self):
+        return self.headers.get("Accept-Ranges") == "bytes"
+
+
+def _key(url):
+    parts = urlsplit(url)
+    return parts.netloc, parts.path + ("?" + parts.query if parts.query else "")
+
+
+def _range_probe(url):
+    # GET فقط برای بایت اول؛ اندازه‌ی کل از Content-Range خوانده می‌شود
+    with net.get(url, headers={"Range": "bytes=0-0"}, stream=True, allow_redirects=True, timeout=PROBE_TIMEOUT) as r:
+        headers = CaseInsensitiveDict(r.headers)
+        total = r.headers.get("Content-Range", "").rpartition("/")[2]
+        if r.status_code == 206 and total.isdigit():
+            headers["Content-Length"] = total
+            headers["Accept-Ranges"] = "bytes"
+            # همان یک بایت خوانده می‌شود تا اتصال به pool برگردد
+            r.content
+        else:
+            # سرور Range را نادیده گرفت؛ بدنه را نمی‌خوانیم و اتصال بسته می‌شود
+            headers["Accept-Ranges"] = "none"
+        return ProbeResult(r.status_code, headers)
+
+
+def fetch(url):
+    r = net.head(url, allow_redirects=True, timeout=PROBE_TIMEOUT)
+    result = ProbeResult(r.status_code, CaseInsensitiveDict(r.headers))
+    if (r.status_code in HEAD_REJECTED or r.status_code < 400 and
+            ("Content-Length" not in r.headers or "Accept-Ranges" not in r.headers)):
+        try:
+            fallback = _range_probe(url)
+        except net.NETWORK_ERRORS:
+            return result
+        if fallback.status_code < 400:
+            return fallback
+    return result
+
+
+class Prober:
+    def __init__(self, max_threads=MAX_PROBE_THREADS, max_per_host=MAX_PROBES_PER_HOST, ttl=PROBE_TTL):
+        self.max_per_host = max_per_host
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_threads)
+        self.results = {}
+        # کلید در حال بررسی -> callbackهای منتظر؛ لینک تکراری دوباره بررسی نمی‌شود
+        self.inflight = {}
+        # لینک‌هایی که منتظر جای خالی میزبانشان هستند؛ Threadها پشت یک میزبان کند گیر نمی‌کنند
+        self.waiting = collections.defaultdict(collections.deque)
+        self.running = collections.Counter()
+
+    def _fresh(self, key):
+        result = self.results.get(key)
+        if result is not None and time.monotonic() - result.time > self.ttl:
+            del self.results[key]
+            return None
+        return result
+
+    def submit(self, url, callback=None):
+        # callback(result) از Thread بررسی صدا زده می‌شود؛ result برای خطای شبکه None است
+        key = _key(url)
+        with self.lock:
+            result = self._fresh(key)
+            if result is None:
+                callbacks = self.inflight.get(key)
+                if callbacks is not None:
+                    if callback:
+                        callbacks.append(callback)
+                    return
+                self.inflight[key] = [callback] if callback else []
+                host = key[0]
+                if self.running[host] < self.max_per_host:
+                    self.running[host] += 1
+                    self.pool.submit(self._run, url)
+                else:
+                    self.waiting[host].append(url)
+                return
+        if callback:
+            callback(result)
+
+    def _run(self, url):
+        while url is not None:
+            key = _key(url)
+            try:
+                result = fetch(url)
+            except Exception:
+                result = None
+            with self.lock:
+                if result is not None:
+                    self.results[key] = result
+                callbacks = self.inflight.pop(key)
+                # جای این لینک به لینک بعدی همین میزبان می‌رسد
+                queue = self.waiting.get(key[0])
+                if queue:
+                    url = queue.popleft()
+                else:
+                    self.waiting.pop(key[0], None)
+                    self.running[key[0]] -= 1
+                    if not self.running[key[0]]:
+                        del self.running[key[0]]
+                    url = None
+            for callback in callbacks:
+                try:
+                    callback(result)
+                except Exception:
+                    pass
+
+    def take(self, url):
+        # نتیجه‌ی تازه یک بار به جای HEAD دانلود استفاده می‌شود؛ دفعه‌ی بعد دوباره از سرور می‌پرسیم
+        with self.lock:
+            result = self._fresh(_key(url))
+            if result is not None:
+                del self.results[_key(url)]
+            return result
+
+    def pending(self):
+        with self.lock:
+            return len(self.inflight)
+
+
+prober = Prober()
@@ -0,0 +1,63 @@
+import threading
+import time
+
+# وزن نمونه‌ی جدید در میانگین نمایی سرعت
+SPEED_SMOOTHING = 0.3
+
+
+def sizeof_fmt(num, suffix="B"):
+    for unit in ["", "K", "M", "G", "T", "P"]:
+        if abs(num) < 1024.0:
+            return f"{num:3.1f}{unit}{suffix}"
+        num /= 1024.0
+    return f"{num:.1f}Y{suffix}"
+
+
+class ByteCounter:
+    # هر شمارنده فقط یک نویسنده دارد، پس قفل لازم نیست و جمع نهایی دقیق است
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, n):
+        self.value += n
+
+
+class ProgressMeter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = []
+        self.base = 0
+        self.speed = 0.0
+        self.last_total = 0
+        self.last_time = time.monotonic()
+
+    def reset(self, base=0):
+        with self.lock:
+            self.counters = []
+            self.base = base
+        self.speed = 0.0
+        self.last_total = base
+        self.last_time = time.monotonic()
+
+    def new_counter(self):
+        counter = ByteCounter()
+        with self.lock:
+            self.counters = self.counters + [counter]
+        return counter
+
+    def total(self):
+        return self.base + sum(c.value for c in self.counters)
+
+    def snapshot(self):
+        # فقط از یک خواننده (تیک رابط کاربری) صدا زده می‌شود
+        now = time.monotonic()
+        total = self.total()
+        elapsed = now - self.last_time
+        if elapsed > 0:
+            instant = (total - self.last_total) / elapsed
+            self.speed = SPEED_SMOOTHING * instant + (1 - SPEED_SMOOTHING) * self.speed
+        self.last_total = total
+        self.last_time = now
+        return total, self.speed
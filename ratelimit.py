@@ -0,0 +1,82 @@
+import threading
+import time
+
+from control import CANCELLED, PAUSED
+
+# هر Worker توکن‌ها را دسته‌ای برمی‌دارد تا قفل سطل در هر chunk گرفته نشود
+QUANTUM = 64 * 1024
+MIN_QUANTUM = 1024
+
+
+class TokenBucket:
+    def __init__(self, rate=0, burst=None):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.capacity = 0
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        # rate بر حسب بایت در ثانیه؛ صفر یعنی بدون محدودیت
+        with self.lock:
+            self.rate = rate
+            self.capacity = burst or max(rate // 4, QUANTUM)
+            self.tokens = min(self.tokens, self.capacity) if rate else 0.0
+            self.last = time.monotonic()
+
+    def reserve(self, n):
+        # توکن را همین حالا کم می‌کنیم (حتی منفی) و زمان انتظار را برمی‌گردانیم؛
+        # این‌طوری درخواست‌ها به ترتیب رسیدن سرویس می‌گیرند
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            rate = self.rate
+            if not rate:
+                return 0.0
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * rate)
+            self.last = now
+            self.tokens -= n
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / rate
+
+
+class Throttle:
+    def __init__(self, *buckets, control=None):
+        self.buckets = buckets
+        # با control، مکث و لغو صبر محدودیت سرعت را قطع می‌کنند
+        self.control = control
+        self.allowance = 0
+
+    def reserve(self, n):
+        self.allowance -= n
+        if self.allowance >= 0:
+            return 0.0
+        rates = [b.rate for b in self.buckets if b.rate]
+        if not rates:
+            self.allowance = 0
+            return 0.0
+        quantum = max(-self.allowance, min(QUANTUM, max(min(rates) // 10, MIN_QUANTUM)))
+        # از همه‌ی سطل‌ها همزمان رزرو می‌کنیم و فقط به اندازه‌ی کندترین صبر می‌کنیم
+        wait = max(b.reserve(quantum) for b in self.buckets)
+        self.allowance += quantum
+        return wait
+
+    def consume(self, n):
+        # وضعیت control بعد از صبر را برمی‌گرداند؛ None یعنی صبری نبود
+        wait = self.reserve(n)
+        if wait <= 0:
+            return None
+        if self.control is None:
+            time.sleep(wait)
+            return None
+        return self.control.sleep(wait, (PAUSED, CANCELLED))
+
+
+global_bucket = TokenBucket()
+
+
+def set_global_limit(rate):
+    global_bucket.set_rate(rate)
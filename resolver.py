@@ -0,0 +1,64 @@
+import socket
+import threading
+import time
+
+from urllib3.util.connection import allowed_gai_family
+
+# getaddrinfo سیستم TTL رکورد را برنمی‌گرداند؛ مثل مرورگرها یک TTL ثابت کوتاه
+DNS_TTL = 60.0
+# نام‌هایی که resolve نشدند هم کمی نگه داشته می‌شوند تا هر Worker دوباره منتظر DNS نماند
+NEGATIVE_TTL = 5.0
+
+
+class DNSCache:
+    def __init__(self, ttl=DNS_TTL, negative_ttl=NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        # (host, port) -> (زمان انقضا، فهرست آدرس‌ها یا socket.gaierror)
+        self.entries = {}
+        # برای هر نام یک قفل؛ Workerهایی که با هم شروع می‌کنند فقط یک پرس‌وجو می‌فرستند
+        self.host_locks = {}
+
+    def _cached(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def resolve(self, host, port):
+        # آدرس‌ها به همان ترتیب getaddrinfo؛ اگر همه‌شان وصل نشدند forget صدا زده می‌شود
+        key = (host, port)
+        with self.lock:
+            result = self._cached(key)
+            if result is None:
+                host_lock = self.host_locks.setdefault(key, threading.Lock())
+        if result is None:
+            with host_lock:
+                with self.lock:
+                    result = self._cached(key)
+                if result is None:
+                    result = self._lookup(host, port)
+        if isinstance(result, socket.gaierror):
+            raise result
+        return result
+
+    def _lookup(self, host, port):
+        try:
+            infos = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+            # یک آدرس ممکن است برای چند پروتکل تکرار شده باشد
+            result = list(dict.fromkeys(info[4][0] for info in infos))
+            ttl = self.ttl
+        except socket.gaierror as e:
+            result = e
+            ttl = self.negative_ttl
+        with self.lock:
+            self.entries[(host, port)] = (time.monotonic() + ttl, result)
+        return result
+
+    def forget(self, host, port):
+        with self.lock:
+            self.entries.pop((host, port), None)
+
+
+resolver = DNSCache()
@@ -0,0 +1,190 @@
+import heapq
+import itertools
+import threading
+from urllib.parse import urlsplit
+
+import metrics
+import net
+from probe import prober
+
+MAX_ACTIVE_DOWNLOADS = 3
+MAX_DOWNLOADS_PER_HOST = 2
+
+# ترتیب صف: fifo، priority (بزرگ‌تر زودتر) یا sjf (کوچک‌ترین فایل زودتر)
+POLICIES = ("fifo", "priority", "sjf")
+
+
+def host_of(url):
+    return urlsplit(url).hostname or ""
+
+
+class DownloadScheduler:
+    def __init__(self, max_active=MAX_ACTIVE_DOWNLOADS, max_per_host=MAX_DOWNLOADS_PER_HOST, policy="sjf", on_done=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy: {policy}")
+        self.max_active = max_active
+        self.max_per_host = max_per_host
+        self.policy = policy
+        # submit جای on_finished آیتم را می‌گیرد؛ کسی که باید از پایان باخبر شود این را می‌دهد
+        self.on_done = on_done
+        self.lock = threading.Lock()
+        # یک heap برای هر میزبان؛ ready سر صف میزبان‌هایی را دارد که جای خالی دارند
+        self.queues = {}
+        self.ready = []
+        self.heads = {}
+        self.entries = {}
+        # لینک -> آیتمی که برایش در صف یا در حال دانلود است، و تکراری‌هایی که بعد از آن کپی می‌شوند
+        self.leaders = {}
+        self.followers = {}
+        self.active = set()
+        self.per_host = {}
+        self.counter = itertools.count()
+
+    def submit(self, item, priority=0):
+        # آیتم باید start() داشته باشد و on_finished را بعد از پایان صدا بزند
+        item.priority = priority
+        item.on_finished = self.finished
+        with self.lock:
+            leader = self.leaders.setdefault(item.url, item)
+            if leader is not item:
+                # همین لینک در صف یا در حال دانلود است؛ تکراری جای صف و اتصال نمی‌گیرد
+                self.followers.setdefault(item.url, []).append(item)
+                return
+        if self.policy == "sjf" and not item.filesize:
+            # بررسی‌ها همزمان و با سقف هر میزبان؛ آیتم بعد از معلوم شدن اندازه وارد صف می‌شود
+            prober.submit(item.url, lambda result: self._probed(item, result))
+        else:
+            self._push(item)
+
+    def _probed(self, item, result):
+        if result is not None and not item.filesize:
+            item.filesize = result.filesize
+        self._push(item)
+
+    def _key(self, item):
+        if self.policy == "fifo":
+            return (0, 0)
+        if self.policy == "priority":
+            return (-item.priority, 0)
+        # اندازه‌ی نامعلوم آخر صف
+        return (-item.priority, item.filesize or float("inf"))
+
+    def _push(self, item):
+        # تا نوبت آیتم برسد DNS و اتصال‌های میزبانش آماده‌اند
+        net.prewarm(item.url)
+        with self.lock:
+            entry = [self._key(item), next(self.counter), item, True]
+            self.entries[id(item)] = entry
+            host = host_of(item.url)
+            heapq.heappush(self.queues.setdefault(host, []), entry)
+            self._advertise(host)
+        self._dispatch()
+
+    def _advertise(self, host):
+        # سر صف میزبان فقط وقتی در ready است که میزبان جای خالی داشته باشد؛
+        # پس dispatch هیچ‌وقت آیتم‌های میزبانی را که پر است یکی‌یکی بیرون نمی‌کشد
+        queue = self.queues.get(host)
+        while queue and not queue[0][3]:
+            heapq.heappop(queue)
+        if not queue:
+            self.queues.pop(host, None)
+            self.heads.pop(host, None)
+            return
+        if self.per_host.get(host, 0) >= self.max_per_host:
+            return
+        top = queue[0]
+        if self.heads.get(host) is not top:
+            self.heads[host] = top
+            heapq.heappush(self.ready, (top[0], top[1], host, top))
+
+    def set_priority(self, item, priority):
+        with self.lock:
+            item.priority = priority
+            entry = self.entries.get(id(item))
+            if entry is None:
+                return
+            entry[3] = False
+            new_entry = [self._key(item), entry[1], item, True]
+            self.entries[id(item)] = new_entry
+            host = host_of(item.url)
+            heapq.heappush(self.queues[host], new_entry)
+            self._advertise(host)
+
+    def set_limits(self, max_active=None, max_per_host=None):
+        with self.lock:
+            if max_active is not None:
+                self.max_active = max_active
+            if max_per_host is not None:
+                self.max_per_host = max_per_host
+                for host in list(self.queues):
+                    self._advertise(host)
+        self._dispatch()
+
+    def remove(self, item):
+        with self.lock:
+            entry = self.entries.pop(id(item), None)
+            followers = []
+            if entry is not None:
+                entry[3] = False
+                self._advertise(host_of(item.url))
+                followers = self._drop_leader(item)
+            elif item in self.followers.get(item.url, ()):
+                self.followers[item.url].remove(item)
+        # تکراری‌های آیتمی که هنوز شروع نشده بود حالا خودشان در صف‌اند
+        for follower in followers:
+            self.submit(follower, follower.priority)
+
+    def _drop_leader(self, item):
+        if self.leaders.get(item.url) is not item:
+            return []
+        del self.leaders[item.url]
+        return self.followers.pop(item.url, [])
+
+    def finished(self, item):
+        with self.lock:
+            if item in self.active:
+                self.active.discard(item)
+                host = host_of(item.url)
+                self.per_host[host] -= 1
+                self._advertise(host)
+            followers = self._drop_leader(item)
+        self._dispatch()
+        if followers and item.completed:
+            # کپی از نتیجه‌ی دانلود؛ بدون اتصال و بدون جای صف
+            for follower in followers:
+                follower.start_from(item)
+        else:
+            # دانلود اول موفق نشد؛ تکراری‌ها دوباره وارد صف می‌شوند و اولی خودش دانلود می‌کند
+            for follower in followers:
+                self.submit(follower, follower.priority)
+        if self.on_done:
+            self.on_done(item)
+
+    def pending_count(self):
+        with self.lock:
+            return len(self.entries)
+
+    def _dispatch(self):
+        to_start = []
+        with self.lock:
+            while self.ready and len(self.active) < self.max_active:
+                _, _, host, entry = heapq.heappop(self.ready)
+                if self.heads.get(host) is not entry:
+                    # سر صف این میزبان از وقتی در ready گذاشته شد عوض شده
+                    continue
+                del self.heads[host]
+                queue = self.queues[host]
+                if queue[0] is not entry or not entry[3] or self.per_host.get(host, 0) >= self.max_per_host:
+                    self._advertise(host)
+                    continue
+                heapq.heappop(queue)
+                item = entry[2]
+                del self.entries[id(item)]
+                self.active.add(item)
+                self.per_host[host] = self.per_host.get(host, 0) + 1
+                to_start.append(item)
+                self._advertise(host)
+            metrics.QUEUE_DEPTH.set(value=len(self.entries))
+            metrics.ACTIVE_DOWNLOADS.set(value=len(self.active))
+        for item in to_start:
+            item.start()
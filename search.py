@@ -0,0 +1,70 @@
+from scheduler import host_of
+
+# وضعیت‌ها ثابت نیستند، پس ایندکس نمی‌شوند و روی نتیجه‌ی متن و میزبان اعمال می‌شوند
+STATUSES = ("all", "active", "queued", "completed", "failed", "cancelled")
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    # ایندکس سه‌حرفی روی نام فایل‌ها؛ نتیجه‌ها به ترتیب اضافه شدن برمی‌گردند
+    def __init__(self):
+        self.items = []
+        self.names = []
+        self.trigrams = {}
+        self.hosts = {}
+        self.last_key = None
+        self.last_ids = None
+
+    def add(self, task):
+        item_id = len(self.items)
+        name = task.local_filename.lower()
+        self.items.append(task)
+        self.names.append(name)
+        for gram in _trigrams(name):
+            self.trigrams.setdefault(gram, []).append(item_id)
+        self.hosts.setdefault(host_of(task.url), []).append(item_id)
+        self.last_key = None
+        return item_id
+
+    def host_names(self):
+        return sorted(self.hosts)
+
+    def matches(self, task, term="", status="all", host=None):
+        return (term.lower() in task.local_filename.lower()
+                and (host is None or host_of(task.url) == host)
+                and (status == "all" or task.state == status))
+
+    def _candidates(self, term, host):
+        # وقتی کاربر ادامه‌ی همان عبارت را تایپ می‌کند، فقط نتیجه‌ی قبلی دوباره فیلتر می‌شود
+        if self.last_key and self.last_key[1] == host and self.last_key[0] in term:
+            ids = self.last_ids
+        elif len(term) >= 3:
+            postings = sorted((self.trigrams.get(gram, ()) for gram in _trigrams(term)), key=len)
+            ids = set(postings[0]).intersection(*postings[1:]) if postings[0] else set()
+            ids = sorted(ids)
+        elif host is not None:
+            ids = self.hosts.get(host, [])
+        else:
+            ids = range(len(self.items))
+        names = self.names
+        if host is not None:
+            hosted = set(self.hosts.get(host, ()))
+            ids = [i for i in ids if i in hosted and term in names[i]]
+        elif term:
+            ids = [i for i in ids if term in names[i]]
+        else:
+            ids = list(ids)
+        self.last_key = (term, host)
+        self.last_ids = ids
+        return ids
+
+    def query(self, term="", status="all", host=None):
+        term = term.strip().lower()
+        ids = self._candidates(term, host)
+        items = self.items
+        if status == "all":
+            return [items[i] for i in ids]
+        return [items[i] for i in ids if items[i].state == status]
@@ -0,0 +1,110 @@
+import threading
+
+import metrics
+
+# کوچک‌ترین تکه‌ای که ارزش جدا کردن دارد؛ باید از بزرگ‌ترین chunk خواندنی بزرگ‌تر باشد
+MIN_SPLIT_SIZE = 1024 * 1024
+
+
+class Segment:
+    def __init__(self, start, end):
+        self.start = start
+        self.pos = start
+        self.end = end
+        self.owner = None
+
+    def remaining(self):
+        return max(0, self.end - self.pos + 1)
+
+    def is_done(self):
+        return self.pos > self.end
+
+
+class SegmentTable:
+    def __init__(self, filesize, count, min_split=MIN_SPLIT_SIZE, align=1):
+        self.filesize = filesize
+        self.min_split = min_split
+        # مرز تکه‌ها مضرب align می‌ماند (مثلا اندازه‌ی پیس‌ها برای هش هر پیس)
+        self.align = align
+        self.lock = threading.Lock()
+        self.segments = []
+        # فایل روی سرور عوض شده (If-Range)؛ Workerها دست می‌کشند و دانلود از اول شروع می‌شود
+        self.stale = False
+
+        count = max(1, min(count, filesize // min_split or 1))
+        part_size = -(-filesize // count)
+        part_size = -(-part_size // align) * align
+        for i in range(count):
+            start = i * part_size
+            end = min(start + part_size - 1, filesize - 1)
+            if start <= end:
+                self.segments.append(Segment(start, end))
+
+    @classmethod
+    def from_ranges(cls, filesize, ranges, min_split=MIN_SPLIT_SIZE, align=1):
+        table = cls(filesize, 1, min_split, align)
+        table.segments = []
+        for start, pos, end in ranges:
+            seg = Segment(start, end)
+            seg.pos = pos
+            table.segments.append(seg)
+        return table
+
+    def snapshot(self):
+        with self.lock:
+            return [(seg.start, seg.pos, seg.end) for seg in self.segments]
+
+    def acquire(self, owner):
+        # اول یک تکه‌ی بی‌صاحب، وگرنه نصف دوم بزرگ‌ترین تکه‌ی باقیمانده
+        with self.lock:
+            for seg in self.segments:
+                if seg.owner is None and not seg.is_done():
+                    seg.owner = owner
+                    return seg
+            return self._steal(owner)
+
+    def release(self, seg):
+        with self.lock:
+            seg.owner = None
+
+    def has_spare_work(self):
+        # آیا Worker تازه چیزی برای گرفتن پیدا می‌کند
+        with self.lock:
+            for seg in self.segments:
+                if seg.is_done():
+                    continue
+                if seg.owner is None or seg.remaining() >= 2 * self.min_split:
+                    return True
+            return False
+
+    def _steal(self, owner):
+        victim = None
+        for seg in self.segments:
+            if seg.owner is not None and (victim is None or seg.remaining() > victim.remaining()):
+                victim = seg
+        if victim is None or victim.remaining() < 2 * self.min_split:
+            return None
+        # pos ممکن است همزمان جلو برود؛ چون حداقل min_split فاصله داریم، chunk در حال نوشتن قطع نمی‌شود
+        mid = (victim.pos + victim.remaining() // 2) // self.align * self.align
+        if mid < victim.pos + self.min_split:
+            mid += self.align
+        if mid > victim.end - self.min_split + 1:
+            return None
+        metrics.SEGMENT_STEALS.inc()
+        new_seg = Segment(mid, victim.end)
+        new_seg.owner = owner
+        victim.end = mid - 1
+        self.segments.append(new_seg)
+        return new_seg
+
+    def add_range(self, start, end):
+        with self.lock:
+            self.segments.append(Segment(start, end))
+
+    def is_complete(self):
+        with self.lock:
+            return all(seg.is_done() for seg in self.segments)
+
+    def remaining(self):
+        with self.lock:
+            return sum(seg.remaining() for seg in self.segments)
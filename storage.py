@@ -0,0 +1,158 @@
+import os
+import queue
+import threading
+
+from chunkreader import MAX_CHUNK
+
+# سقف کل حافظه‌ای که داده‌ی در صف نوشتن می‌تواند بگیرد؛ وقتی پر شود Workerها منتظر می‌مانند
+WRITE_BEHIND_LIMIT = 64 * 1024 * 1024
+
+
+class BufferPool:
+    def __init__(self, buffer_size, limit):
+        self.buffer_size = buffer_size
+        self.max_buffers = max(1, limit // buffer_size)
+        self.cond = threading.Condition()
+        self.free = []
+        self.allocated = 0
+
+    def acquire(self):
+        with self.cond:
+            while not self.free and self.allocated >= self.max_buffers:
+                self.cond.wait()
+            if self.free:
+                return self.free.pop()
+            self.allocated += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buf):
+        with self.cond:
+            self.free.append(buf)
+            self.cond.notify()
+
+
+buffer_pool = BufferPool(MAX_CHUNK, WRITE_BEHIND_LIMIT)
+_write_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _writer_loop():
+    while True:
+        sink, offset, buf, n = _write_queue.get()
+        if offset is None:
+            # checkpoint: همه‌ی نوشتن‌های قبلی این sink انجام شده‌اند؛ buf تابعی است که fsync و ژورنال را می‌نویسد
+            try:
+                if sink.error is None:
+                    buf()
+            except OSError as e:
+                sink.error = e
+            finally:
+                sink.write_done()
+            continue
+        try:
+            if sink.error is None:
+                data = memoryview(buf)[:n]
+                sink.pwrite(data, offset)
+                if sink.on_written is not None:
+                    sink.on_written(offset, data)
+        except OSError as e:
+            sink.error = e
+        finally:
+            buffer_pool.release(buf)
+            sink.write_done()
+
+
+def _ensure_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, daemon=True)
+            _writer.start()
+
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, "pwrite"):
+        return os.pwrite(fd, data, offset)
+    # ویندوز pwrite ندارد؛ فقط Thread نویسنده از این fd استفاده می‌کند
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, data)
+
+
+class DiskSink:
+    def __init__(self, filepath, filesize, fresh=True):
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if fresh:
+            flags |= os.O_TRUNC
+        self.fd = os.open(filepath, flags, 0o644)
+        self.filesize = filesize
+        self.cond = threading.Condition()
+        self.submitted = 0
+        self.completed = 0
+        self.error = None
+        # بعد از هر نوشتن در Thread نویسنده صدا زده می‌شود (مثلا StreamHasher)
+        self.on_written = None
+        if fresh:
+            self.preallocate()
+        _ensure_writer()
+
+    def preallocate(self):
+        # فضای واقعی رزرو می‌شود تا فایل sparse و تکه‌تکه نشود
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self.fd, 0, self.filesize)
+                return
+            except OSError:
+                pass
+        os.ftruncate(self.fd, self.filesize)
+
+    def acquire_buffer(self):
+        return buffer_pool.acquire()
+
+    def release_buffer(self, buf):
+        buffer_pool.release(buf)
+
+    def write(self, offset, buf, n):
+        # مالکیت buf با صف نوشتن است تا Thread نویسنده آن را برگرداند
+        if self.error is not None:
+            buffer_pool.release(buf)
+            raise self.error
+        with self.cond:
+            self.submitted += 1
+        _write_queue.put((self, offset, buf, n))
+
+    def checkpoint(self, commit):
+        # commit در Thread نویسنده و بعد از نوشتن‌هایی که تا الان در صف رفته‌اند اجرا می‌شود
+        with self.cond:
+            self.submitted += 1
+        _write_queue.put((self, None, commit, 0))
+
+    def pwrite(self, data, offset):
+        while data:
+            written = _pwrite(self.fd, data, offset)
+            data = data[written:]
+            offset += written
+
+    def write_done(self):
+        with self.cond:
+            self.completed += 1
+            self.cond.notify_all()
+
+    def _wait_written(self):
+        with self.cond:
+            target = self.submitted
+            while self.completed < target:
+                self.cond.wait()
+
+    def drain(self):
+        self._wait_written()
+        if self.error is not None:
+            raise self.error
+
+    def sync(self):
+        self.drain()
+        os.fsync(self.fd)
+
+    def close(self):
+        self._wait_written()
+        os.close(self.fd)
@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import threading
+
+from engine import Download
+
+# تغییرات صف در حافظه جمع می‌شوند و هر این‌قدر یک‌جا در یک تراکنش نوشته می‌شوند
+FLUSH_INTERVAL = 1.0
+LOAD_BATCH = 500
+FINAL_STATES = ("completed", "cancelled", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY,
+    urls TEXT NOT NULL,
+    checksum TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    dest_dir TEXT NOT NULL,
+    filesize INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    state TEXT NOT NULL,
+    status_text TEXT NOT NULL,
+    downloaded INTEGER NOT NULL DEFAULT 0
+)
+"""
+COLUMNS = "id, urls, checksum, priority, dest_dir, filesize, etag, state, status_text, downloaded"
+
+
+def default_path(app_file):
+    # هر برنامه (W، W2، S، ...) صف خودش را دارد
+    name = os.path.splitext(os.path.basename(app_file))[0]
+    return os.path.join(os.path.expanduser("~"), ".python-idm", name + ".db")
+
+
+def _connect(path):
+    db = sqlite3.connect(path)
+    # WAL: خواندن موقع نوشتن قفل نمی‌شود؛ NORMAL: fsync فقط در checkpoint، نه هر تراکنش
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def _progress(task):
+    return (task.dest_dir, task.filesize, task.etag, task.state, task.status_text,
+            task.downloaded_bytes if "_meter" in task.__dict__ else 0)
+
+
+class QueueStore:
+    # فقط add/watch/load/close از Thread رابط کاربری؛ نوشتن در Thread جدا و دسته‌ای
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.db = _connect(path)
+        with self.db:
+            self.db.execute(SCHEMA)
+        self.next_id = (self.db.execute("SELECT MAX(id) FROM downloads").fetchone()[0] or 0) + 1
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.inserts = []
+        # آیتم‌های تمام‌نشده و آخرین وضعیتی که از هر کدام نوشته شده
+        self.watched = {}
+        self.stopped = threading.Event()
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def add(self, task):
+        with self.lock:
+            row_id = self.next_id
+            self.next_id += 1
+            self.ids[task] = row_id
+            self.inserts.append((row_id, json.dumps(task.urls), task.checksum_spec,
+                                 task.priority) + _progress(task))
+            self.watched[task] = None
+        return row_id
+
+    def watch(self, task):
+        # وضعیت آیتم با نرخ ثابت نمونه‌برداری می‌شود؛ مسیر دانلود هیچ هزینه‌ای نمی‌دهد
+        with self.lock:
+            if task in self.ids and task not in self.watched:
+                self.watched[task] = None
+
+    def load(self, batch=LOAD_BATCH):
+        # دسته‌دسته، تا رابط کاربری با صف بزرگ هم بلافاصله باز شود
+        cursor = self.db.execute(f"SELECT {COLUMNS} FROM downloads ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            yield [self._restore(row) for row in rows]
+
+    def _restore(self, row):
+        row_id, urls, checksum, priority, dest_dir, filesize, etag, state, status_text, downloaded = row
+        task = Download(json.loads(urls), dest_dir, checksum)
+        task.priority = priority
+        task.filesize = filesize
+        task.etag = etag
+        if state == "completed":
+            task.completed = True
+        elif state == "cancelled":
+            task.control.cancel()
+        elif state == "failed":
+            task.done.set()
+        else:
+            # فعال هنگام بستن برنامه هم دوباره به صف برمی‌گردد و از ژورنال ادامه می‌دهد
+            status_text = "در صف"
+        task.update_status(status_text)
+        if downloaded:
+            task.meter.reset(downloaded)
+        last = _progress(task)
+        with self.lock:
+            self.ids[task] = row_id
+            if state not in FINAL_STATES:
+                self.watched[task] = last
+        return task
+
+    def _writer_loop(self):
+        db = _connect(self.path)
+        try:
+            while not self.stopped.wait(FLUSH_INTERVAL):
+                self._flush(db)
+            self._flush(db)
+        finally:
+            db.close()
+
+    def _collect(self):
+        with self.lock:
+            inserts, self.inserts = self.inserts, []
+            updates = []
+            for task, last in list(self.watched.items()):
+                # هنوز شروع نشده؛ با صف چندده‌هزارتایی نمونه‌برداری از همه هر ثانیه گران است
+                if last is not None and not task.is_downloading and "_done" not in task.__dict__:
+                    continue
+                current = _progress(task)
+                if current != last:
+                    updates.append(current + (self.ids[task],))
+                    self.watched[task] = current
+                if current[3] in FINAL_STATES:
+                    del self.watched[task]
+        return inserts, updates
+
+    def _flush(self, db):
+        inserts, updates = self._collect()
+        if not inserts and not updates:
+            return
+        with db:
+            db.executemany(f"INSERT OR REPLACE INTO downloads ({COLUMNS}) VALUES (?,?,?,?,?,?,?,?,?,?)", inserts)
+            db.executemany("UPDATE downloads SET dest_dir=?, filesize=?, etag=?, state=?, status_text=?, downloaded=? "
+                           "WHERE id=?", updates)
+
+    def close(self):
+        self.stopped.set()
+        self.writer.join()
+        self.db.close()
@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# ماژول‌ها در ریشه‌ی مخزن‌اند، نه در یک پکیج
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_server(tmp_path):
+    # سرور Range از bench.py در همین پروسه، روی پورت آزاد؛ handler می‌تواند زیرکلاس RangeHandler باشد
+    from bench import QuietServer, RangeHandler
+
+    servers = []
+
+    def make(base=RangeHandler):
+        root = tmp_path / f"srv{len(servers)}"
+        root.mkdir()
+        handler = type("Handler", (base,), {"root": str(root)})
+        httpd = QuietServer(("127.0.0.1", 0), handler)
+        httpd.root = root
+        httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/"
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return httpd
+
+    yield make
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
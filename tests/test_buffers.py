@@ -0,0 +1,69 @@
+import os
+import socket
+import struct
+
+import pytest
+
+import engine
+from bench import RangeHandler
+from cache import DownloadCache
+from storage import buffer_pool
+
+
+class Cutter:
+    # بعد از limit بایت مثل اتصالی که reset شده خطا می‌دهد
+    def __init__(self, wfile, limit):
+        self.wfile = wfile
+        self.limit = limit
+
+    def write(self, data):
+        if len(data) > self.limit:
+            self.wfile.write(data[:self.limit])
+            self.wfile.flush()
+            raise BrokenPipeError("cut")
+        self.limit -= len(data)
+        return self.wfile.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.wfile, name)
+
+
+class ResettingHandler(RangeHandler):
+    # هر درخواست Range دوم وسط بدنه با RST قطع می‌شود؛ کلاینت وسط readinto خطا می‌گیرد
+    gets = 0
+    cut = False
+
+    def end_headers(self):
+        super().end_headers()
+        if self.command == "GET" and "Range" in self.headers:
+            ResettingHandler.gets += 1
+            if ResettingHandler.gets % 2:
+                self.wfile = Cutter(self.wfile, 64 * 1024)
+                self.close_connection = True
+                self.cut = True
+
+    def finish(self):
+        super().finish()
+        if self.cut:
+            # SO_LINGER صفر: close به جای FIN یک RST می‌فرستد
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, "RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(engine, "cache", DownloadCache(str(tmp_path / "cache.json")))
+
+
+def test_failed_reads_return_pool_buffers(make_server, tmp_path):
+    server = make_server(ResettingHandler)
+    data = os.urandom(3 * 1024 * 1024)
+    for i in range(3):
+        (server.root / f"r{i}.bin").write_bytes(data)
+        task = engine.Download(server.url + f"r{i}.bin", str(tmp_path / "out"))
+        task.run_download()
+        assert task.completed, task.status_text
+        assert (tmp_path / "out" / f"r{i}.bin").read_bytes() == data
+    assert ResettingHandler.gets > 3
+    assert buffer_pool.allocated == len(buffer_pool.free)
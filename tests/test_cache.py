@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import cache as cache_module
+import engine
+from cache import DownloadCache
+
+
+class Task:
+    def __init__(self, url, filepath, etag=None, last_modified=None):
+        self.url = url
+        self.filepath = filepath
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = DownloadCache(str(tmp_path / "cache.json"))
+    monkeypatch.setattr(engine, "cache", cache)
+    yield cache
+    cache.flush()
+
+
+def test_same_url_reuses_its_path_without_validator(cache, tmp_path):
+    path = str(tmp_path / "a.bin")
+    task = Task("http://h/a.bin", path)
+    assert cache.claim(task, path) == path
+    open(path, "wb").close()
+    cache.store(task)
+    cache.release(task)
+    # همان لینک فایل خودش را بازنویسی می‌کند، لینک دیگر "a (1).bin" می‌گیرد
+    assert cache.claim(Task("http://h/a.bin", path), path) == path
+    assert cache.claim(Task("http://other/a.bin", path), path) == str(tmp_path / "a (1).bin")
+    assert cache.lookup("http://h/a.bin") is None
+
+
+def test_paths_are_absolute(cache, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("b.bin", "wb") as f:
+        f.write(b"x")
+    cache.store(Task("http://h/b.bin", "b.bin", etag='"1"'))
+    monkeypatch.chdir(os.path.dirname(tmp_path))
+    entry = cache.lookup("http://h/b.bin")
+    assert entry["filepath"] == str(tmp_path / "b.bin")
+    assert cache.claim(Task("http://h/b.bin", "x"), str(tmp_path / "b.bin")) == str(tmp_path / "b.bin")
+
+
+def test_lookup_rejects_changed_file(cache, tmp_path):
+    path = tmp_path / "c.bin"
+    path.write_bytes(b"old")
+    cache.store(Task("http://h/c.bin", str(path), etag='"1"'))
+    assert cache.lookup("http://h/c.bin")["etag"] == '"1"'
+    path.write_bytes(b"edited")
+    assert cache.lookup("http://h/c.bin") is None
+
+
+def test_stores_are_saved_together(cache, tmp_path, monkeypatch):
+    # هر store کل cache.json را بازنویسی نمی‌کند؛ flush همه را یک‌جا می‌نویسد
+    monkeypatch.setattr(cache_module, "SAVE_DELAY", 60.0)
+    for i in range(2000):
+        path = tmp_path / f"{i}.bin"
+        path.write_bytes(b"x")
+        cache.store(Task(f"http://h/{i}.bin", str(path), etag=f'"{i}"'))
+    assert not os.path.exists(cache.path)
+    cache.flush()
+    again = DownloadCache(cache.path)
+    assert again.lookup("http://h/1999.bin")["filepath"] == str(tmp_path / "1999.bin")
+
+
+def test_not_modified_copy_is_owned(cache, server, tmp_path):
+    src = server.root / "c.bin"
+    src.write_bytes(b"1" * 1000)
+    url = server.url + "c.bin"
+    first = engine.Download(url, str(tmp_path / "dl1"))
+    first.run_download()
+    copy = engine.Download(url, str(tmp_path / "dl3"))
+    copy.run_download()
+    assert copy.status_text == "✅ بدون تغییر"
+    # فایل روی سرور عوض شد؛ دانلود دوباره در همان پوشه همان نام را بازنویسی می‌کند
+    src.write_bytes(b"2" * 2000)
+    again = engine.Download(url, str(tmp_path / "dl3"))
+    again.run_download()
+    assert again.completed
+    assert sorted(os.listdir(tmp_path / "dl3")) == ["c.bin"]
+    assert (tmp_path / "dl3" / "c.bin").read_bytes() == b"2" * 2000
+
+
+def test_duplicate_links_download_once(cache, server, tmp_path):
+    from scheduler import DownloadScheduler
+
+    (server.root / "d.bin").write_bytes(b"d" * 5000)
+    url = server.url + "d.bin"
+    scheduler = DownloadScheduler(policy="fifo")
+    tasks = [engine.Download(url, str(tmp_path / name)) for name in ("a", "a", "b")]
+    for task in tasks:
+        scheduler.submit(task)
+    for task in tasks:
+        assert task.done.wait(10)
+    assert all(task.completed for task in tasks)
+    assert tasks[1].filepath == tasks[0].filepath
+    assert (tmp_path / "b" / "d.bin").read_bytes() == b"d" * 5000
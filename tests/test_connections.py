@@ -0,0 +1,42 @@
+import os
+
+from bench import HeadlessItem
+from engine import DownloadWorker
+from journal import ResumeJournal
+from mirrors import MirrorSet
+from segments import SegmentTable, MIN_SPLIT_SIZE
+from storage import DiskSink
+
+
+def fetch_all(url, dest, filesize, count):
+    item = HeadlessItem(url, dest)
+    item.filesize = filesize
+    table = SegmentTable(filesize, count)
+    journal = ResumeJournal(item.filepath, url, filesize)
+    sink = DiskSink(item.filepath, filesize)
+    journal.attach(table, sink)
+    # یک Worker همه‌ی تکه‌ها را پشت سر هم می‌گیرد
+    DownloadWorker(MirrorSet([url]), table, journal, sink, item, 0).run()
+    sink.close()
+    journal.remove()
+    return item.filepath
+
+
+def test_segments_reuse_one_connection(server, tmp_path):
+    data = os.urandom(5 * MIN_SPLIT_SIZE)
+    (server.root / "f.bin").write_bytes(data)
+    path = fetch_all(server.url + "f.bin", str(tmp_path), len(data), 5)
+    with open(path, "rb") as f:
+        assert f.read() == data
+    # پنج درخواست Range روی یک اتصال keep-alive
+    assert server.connections == 1
+
+
+def test_downloads_reuse_warm_connection(server, tmp_path):
+    data = os.urandom(2 * MIN_SPLIT_SIZE)
+    (server.root / "g.bin").write_bytes(data)
+    for i in range(3):
+        dest = tmp_path / str(i)
+        dest.mkdir()
+        fetch_all(server.url + "g.bin", str(dest), len(data), 2)
+    assert server.connections == 1
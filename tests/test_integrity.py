@@ -0,0 +1,145 @@
+import hashlib
+import os
+import random
+
+import pytest
+
+import integrity
+from integrity import (parse_expected_hash, parse_checksum_file, parse_metalink,
+                       PieceVerifier, StreamHasher, Checksum)
+
+DATA = b"hello world\n"
+SHA256 = hashlib.sha256(DATA).hexdigest()
+MD5 = hashlib.md5(DATA).hexdigest()
+
+
+def test_expected_hash_forms():
+    assert parse_expected_hash(f"sha256:{SHA256}").algo == "sha256"
+    checksum = parse_expected_hash(f"SHA-256={SHA256.upper()}")
+    assert (checksum.algo, checksum.digest) == ("sha256", SHA256)
+    # نوع از طول hex معلوم می‌شود
+    assert parse_expected_hash(MD5).algo == "md5"
+    with pytest.raises(ValueError):
+        parse_expected_hash("abc123")
+
+
+def test_checksum_file_gnu_and_bsd():
+    gnu = f"{'0' * 64}  other.iso\n{SHA256} *dir/file.iso\n"
+    assert parse_checksum_file(gnu, "file.iso").digest == SHA256
+    bsd = f"SHA256 (other.iso) = {'0' * 64}\nSHA256 (file.iso) = {SHA256}\n"
+    checksum = parse_checksum_file(bsd, "file.iso")
+    assert (checksum.algo, checksum.digest) == ("sha256", SHA256)
+
+
+def test_checksum_file_single_hash_and_missing():
+    assert parse_checksum_file(f"{MD5}\n", "file.iso").algo == "md5"
+    with pytest.raises(ValueError):
+        parse_checksum_file(f"{SHA256}  other.iso\n", "file.iso")
+
+
+METALINK = """<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+  <file name="other.iso"><hash type="sha-256">{other}</hash></file>
+  <file name="file.iso">
+    <hash type="sha-256">{digest}</hash>
+    <pieces length="4" type="{piece_type}">
+      <hash>{p0}</hash><hash>{p1}</hash>
+    </pieces>
+  </file>
+</metalink>"""
+
+
+def test_metalink_picks_file_and_pieces():
+    p0, p1 = (hashlib.sha256(b).hexdigest() for b in (b"abcd", b"ef"))
+    text = METALINK.format(other="0" * 64, digest=SHA256, piece_type="sha-256", p0=p0, p1=p1)
+    checksum = parse_metalink(text, "file.iso")
+    assert (checksum.algo, checksum.digest, checksum.piece_size) == ("sha256", SHA256, 4)
+    assert checksum.pieces == [p0, p1]
+
+
+def test_metalink_pieces_with_other_algorithm():
+    p0, p1 = (hashlib.sha1(b).hexdigest() for b in (b"abcd", b"ef"))
+    text = METALINK.format(other="0" * 64, digest=SHA256, piece_type="sha-1", p0=p0, p1=p1)
+    checksum = parse_metalink(text, "file.iso")
+    # هش پیس‌ها نوع خودشان را دارند و هش کل فایل کنار گذاشته می‌شود
+    assert (checksum.algo, checksum.digest) == ("sha1", None)
+    with pytest.raises(ValueError):
+        parse_metalink(text, "missing.iso")
+
+
+def write_file(tmp_path, data):
+    path = tmp_path / "f.bin"
+    path.write_bytes(data)
+    return os.open(path, os.O_RDONLY)
+
+
+def test_stream_hasher_out_of_order(tmp_path):
+    data = os.urandom(300 * 1024)
+    fd = write_file(tmp_path, data)
+    try:
+        chunks = [(offset, data[offset:offset + 10000]) for offset in range(0, len(data), 10000)]
+        random.Random(1).shuffle(chunks)
+        hasher = StreamHasher(Checksum("sha256", hashlib.sha256(data).hexdigest()), fd)
+        for offset, chunk in chunks:
+            hasher.on_written(offset, chunk)
+            # بازه‌های پشت سر هم یکی می‌شوند؛ هر شروع با یک پایان جفت است
+            assert len(hasher.pending) == len(hasher.ends)
+        assert hasher.cursor == len(data) and not hasher.pending
+        assert hasher.finish(len(data))
+    finally:
+        os.close(fd)
+
+
+def test_stream_hasher_merges_adjacent_ranges(tmp_path):
+    data = os.urandom(100)
+    fd = write_file(tmp_path, data)
+    try:
+        hasher = StreamHasher(Checksum("md5", hashlib.md5(data).hexdigest()), fd)
+        hasher.on_written(50, data[50:60])
+        hasher.on_written(60, data[60:80])
+        assert hasher.pending == {50: 80}
+        hasher.on_written(0, data[:50])
+        assert hasher.cursor == 80
+        assert hasher.finish(len(data))
+    finally:
+        os.close(fd)
+
+
+def test_stream_hasher_resume_reads_only_earlier_ranges(tmp_path, monkeypatch):
+    # بعد از ادامه فقط بازه‌های اجرای قبلی از دیسک خوانده می‌شوند، نه کل فایل
+    data = os.urandom(300 * 1000)
+    fd = write_file(tmp_path, data)
+    read = []
+    real_pread = integrity._pread
+
+    def pread(fd, n, offset):
+        read.append(n)
+        return real_pread(fd, n, offset)
+
+    monkeypatch.setattr(integrity, "_pread", pread)
+    try:
+        hasher = StreamHasher(Checksum("sha256", hashlib.sha256(data).hexdigest()), fd)
+        hasher.resume([(0, 100000, 149999), (150000, 200000, 299999)])
+        assert hasher.cursor == 100000 and hasher.pending == {150000: 200000}
+        hasher.on_written(100000, data[100000:150000])
+        assert hasher.cursor == 200000
+        hasher.on_written(200000, data[200000:])
+        assert hasher.cursor == len(data)
+        assert hasher.finish(len(data))
+        assert sum(read) == 150000
+    finally:
+        os.close(fd)
+
+
+def test_piece_verifier_finds_bad_piece(tmp_path):
+    data = b"abcdefghij"
+    pieces = [hashlib.sha256(data[i:i + 4]).hexdigest() for i in range(0, 10, 4)]
+    pieces[1] = "0" * 64
+    fd = write_file(tmp_path, data)
+    try:
+        verifier = PieceVerifier(Checksum("sha256", None, 4, pieces), len(data), fd)
+        verifier.feed(0, data[:6])
+        # بقیه از دیسک، مثل ادامه بعد از ری‌استارت
+        assert verifier.finish() == [1]
+    finally:
+        os.close(fd)
@@ -0,0 +1,42 @@
+import json
+import os
+import threading
+
+from journal import ResumeJournal
+from segments import SegmentTable
+from storage import DiskSink
+
+MB = 1024 * 1024
+
+
+def test_checkpoint_is_written_by_writer_thread(tmp_path, monkeypatch):
+    # Thread سوکت نباید منتظر fsync بماند؛ ژورنال بعد از داده‌ی قبل از خودش نوشته می‌شود
+    path = str(tmp_path / "file.bin")
+    sink = DiskSink(path, 2 * MB)
+    table = SegmentTable(2 * MB, 2)
+    jr = ResumeJournal(path, "http://example/file.bin", 2 * MB)
+    jr.attach(table, sink)
+    caller = threading.current_thread()
+    fsync_threads = []
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        fsync_threads.append(threading.current_thread())
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    seg = table.segments[0]
+    buf = sink.acquire_buffer()
+    sink.write(seg.pos, buf, 1000)
+    seg.pos += 1000
+    jr.last_flush = 0
+    jr.maybe_flush()
+    try:
+        sink.drain()
+        assert fsync_threads and caller not in fsync_threads
+        with open(jr.path, encoding="utf-8") as f:
+            saved = json.load(f)
+        assert [tuple(r) for r in saved["segments"]] == [tuple(r) for r in table.snapshot()]
+    finally:
+        sink.close()
+        jr.remove()
@@ -0,0 +1,23 @@
+import threading
+import time
+
+from control import DownloadControl, CANCELLED, PAUSED
+from ratelimit import TokenBucket, Throttle
+
+
+def throttled(control):
+    # سطل خالی با 1KB/s؛ 64KB یعنی حدود یک دقیقه صبر
+    throttle = Throttle(TokenBucket(1024, burst=1024), control=control)
+    throttle.reserve(1024)
+    return throttle
+
+
+def test_cancel_and_pause_interrupt_throttle():
+    for state, action in ((CANCELLED, "cancel"), (PAUSED, "pause")):
+        control = DownloadControl()
+        control.start()
+        throttle = throttled(control)
+        threading.Timer(0.1, getattr(control, action)).start()
+        started = time.monotonic()
+        assert throttle.consume(64 * 1024) == state
+        assert time.monotonic() - started < 5
@@ -0,0 +1,61 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import resolver
+from resolver import DNSCache
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    calls = []
+
+    def getaddrinfo(host, port, family=0, type=0):
+        calls.append(host)
+        time.sleep(0.05)
+        if host.endswith(".invalid"):
+            raise socket.gaierror(socket.EAI_NONAME, "not found")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", port)),
+                (socket.AF_INET, socket.SOCK_STREAM, 17, "", ("10.0.0.1", port)),
+                (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.2", port))]
+
+    monkeypatch.setattr(resolver.socket, "getaddrinfo", getaddrinfo)
+    return calls
+
+
+def test_cached_within_ttl(lookups):
+    cache = DNSCache(ttl=60)
+    assert cache.resolve("h", 80) == ["10.0.0.1", "10.0.0.2"]
+    assert cache.resolve("h", 80) == ["10.0.0.1", "10.0.0.2"]
+    assert lookups == ["h"]
+
+
+def test_expires_and_forget(lookups):
+    cache = DNSCache(ttl=0.01)
+    cache.resolve("h", 80)
+    time.sleep(0.02)
+    cache.resolve("h", 80)
+    cache.forget("h", 80)
+    cache.resolve("h", 80)
+    assert lookups == ["h", "h", "h"]
+
+
+def test_failures_are_cached_briefly(lookups):
+    cache = DNSCache(negative_ttl=60)
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            cache.resolve("nosuch.invalid", 80)
+    assert lookups == ["nosuch.invalid"]
+
+
+def test_concurrent_lookups_are_coalesced(lookups):
+    cache = DNSCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.resolve("h", 443))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert lookups == ["h"] and len(results) == 8
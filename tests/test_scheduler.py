@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+import net
+from scheduler import DownloadScheduler
+
+
+class Item:
+    def __init__(self, url, filesize=0):
+        self.url = url
+        self.filesize = filesize
+        self.priority = 0
+        self.on_finished = None
+        self.started = False
+        self.completed = False
+        self.source = None
+
+    def start(self):
+        self.started = True
+
+    def start_from(self, leader):
+        self.source = leader
+        self.start()
+
+    def finish(self, completed=True):
+        self.completed = completed
+        self.on_finished(self)
+
+
+@pytest.fixture(autouse=True)
+def no_prewarm(monkeypatch):
+    monkeypatch.setattr(net, "prewarm", lambda url: None)
+
+
+def started(items):
+    return [item for item in items if item.started]
+
+
+def test_limits_per_host_and_total():
+    scheduler = DownloadScheduler(max_active=3, max_per_host=2, policy="fifo")
+    a = [Item(f"http://a/{i}") for i in range(4)]
+    b = [Item(f"http://b/{i}") for i in range(4)]
+    for item in a + b:
+        scheduler.submit(item)
+    # دو تا از a (سقف میزبان)، بعد b با اینکه دیرتر آمده
+    assert started(a) == a[:2]
+    assert started(b) == b[:1]
+    a[0].finish()
+    # a[0] جای یک دانلود a را آزاد کرد و a[2] از b[1] زودتر آمده
+    assert started(a) == a[:3]
+    assert scheduler.pending_count() == 4
+
+
+def test_full_host_does_not_block_other_hosts():
+    scheduler = DownloadScheduler(max_active=4, max_per_host=1, policy="fifo")
+    a = [Item(f"http://a/{i}") for i in range(100)]
+    for item in a:
+        scheduler.submit(item)
+    c = Item("http://c/x")
+    scheduler.submit(c)
+    assert started(a) == a[:1]
+    assert c.started
+
+
+def test_priority_and_remove():
+    scheduler = DownloadScheduler(max_active=1, max_per_host=1, policy="priority")
+    first, low, high, gone = (Item(f"http://a/{i}") for i in range(4))
+    scheduler.submit(first)
+    scheduler.submit(low, 0)
+    scheduler.submit(high, 0)
+    scheduler.submit(gone, 5)
+    scheduler.set_priority(high, 3)
+    scheduler.remove(gone)
+    first.finish()
+    assert high.started and not low.started and not gone.started
+    high.finish()
+    assert low.started and not gone.started
+
+
+def test_sjf_orders_by_size():
+    scheduler = DownloadScheduler(max_active=1, max_per_host=1, policy="sjf")
+    items = [Item(f"http://a/{size}", size) for size in (300, 100, 200)]
+    for item in items:
+        scheduler.submit(item)
+    # اولی وقتی صف خالی بود شروع شد؛ بقیه به ترتیب اندازه
+    order = []
+    for _ in items:
+        current = next(item for item in items if item.started and item not in order)
+        order.append(current)
+        current.finish()
+    assert [item.filesize for item in order] == [300, 100, 200]
+
+
+def test_bulk_submit_from_one_host_is_fast():
+    scheduler = DownloadScheduler(policy="fifo")
+    items = [Item(f"http://a/{i}") for i in range(20000)]
+    t = time.monotonic()
+    for item in items:
+        scheduler.submit(item)
+    assert time.monotonic() - t < 2
+    assert len(started(items)) == 2
+
+
+def test_duplicates_wait_outside_the_queue():
+    scheduler = DownloadScheduler(max_active=2, max_per_host=2, policy="fifo")
+    first, dup, other = Item("http://a/x"), Item("http://a/x"), Item("http://a/y")
+    for item in (first, dup, other):
+        scheduler.submit(item)
+    # تکراری جای دانلود دیگری را نمی‌گیرد
+    assert first.started and other.started and not dup.started
+    assert scheduler.pending_count() == 0
+    first.finish()
+    assert dup.started and dup.source is first
+
+
+def test_duplicate_retries_after_failed_leader():
+    scheduler = DownloadScheduler(max_active=1, max_per_host=1, policy="fifo")
+    first, dup, later = Item("http://a/x"), Item("http://a/x"), Item("http://a/x")
+    for item in (first, dup, later):
+        scheduler.submit(item)
+    first.finish(completed=False)
+    assert dup.started and dup.source is None and not later.started
+    dup.finish()
+    assert later.source is dup
@@ -0,0 +1,49 @@
+from search import SearchIndex
+
+
+class Task:
+    def __init__(self, url, state="queued"):
+        self.url = url
+        self.local_filename = url.rsplit("/", 1)[-1]
+        self.state = state
+
+
+NAMES = ["ubuntu-24.04.iso", "ubuntu-22.04.iso", "debian-12.iso", "Fedora-40.iso", "ub.txt"]
+
+
+def make_index():
+    index = SearchIndex()
+    tasks = []
+    for i, name in enumerate(NAMES):
+        task = Task(f"http://{'a' if i % 2 else 'b'}.example/{name}", "completed" if i == 1 else "queued")
+        index.add(task)
+        tasks.append(task)
+    return index, tasks
+
+
+def brute(tasks, term, status="all", host=None):
+    index = SearchIndex()
+    return [t for t in tasks if index.matches(t, term, status, host)]
+
+
+def test_typing_narrows_previous_result():
+    index, tasks = make_index()
+    for term in ("u", "ub", "ubu", "ubun", "ubuntu-2", "ubuntu-24", "ubuntu-2", "ub", "", "fedora", "iso"):
+        assert index.query(term) == brute(tasks, term), term
+
+
+def test_host_and_status_filters():
+    index, tasks = make_index()
+    assert index.query("iso", host="a.example") == brute(tasks, "iso", host="a.example")
+    assert index.query("iso", host="b.example") == brute(tasks, "iso", host="b.example")
+    assert index.query("ubuntu", status="completed") == [tasks[1]]
+    assert index.query("", host="a.example") == brute(tasks, "", host="a.example")
+
+
+def test_added_item_invalidates_last_result():
+    index, tasks = make_index()
+    assert index.query("ubuntu") == tasks[:2]
+    late = Task("http://c.example/ubuntu-20.04.iso")
+    index.add(late)
+    assert index.query("ubuntu-") == tasks[:2] + [late]
+    assert index.host_names() == ["a.example", "b.example", "c.example"]
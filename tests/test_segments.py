@@ -0,0 +1,85 @@
+from segments import SegmentTable, MIN_SPLIT_SIZE
+
+MB = 1024 * 1024
+
+
+def ranges(table):
+    return [(seg.start, seg.end) for seg in sorted(table.segments, key=lambda s: s.start)]
+
+
+def assert_covers(table, filesize):
+    # تکه‌ها کل فایل را بدون هم‌پوشانی و بدون جای خالی می‌پوشانند
+    pos = 0
+    for start, end in ranges(table):
+        assert start == pos and end >= start
+        pos = end + 1
+    assert pos == filesize
+
+
+def test_initial_split_covers_file():
+    for filesize in (1, MB - 1, 10 * MB + 17):
+        table = SegmentTable(filesize, 8)
+        assert_covers(table, filesize)
+
+
+def test_small_file_is_not_split_below_min_split():
+    assert len(SegmentTable(3 * MIN_SPLIT_SIZE - 1, 8).segments) == 2
+    assert len(SegmentTable(MIN_SPLIT_SIZE // 2, 8).segments) == 1
+
+
+def test_initial_split_respects_alignment():
+    align = 256 * 1024
+    table = SegmentTable(10 * MB + 5, 3, align=align)
+    assert_covers(table, 10 * MB + 5)
+    assert all(start % align == 0 for start, _ in ranges(table))
+
+
+def test_steal_takes_second_half_of_largest():
+    table = SegmentTable(8 * MB, 2)
+    a, b = table.acquire("a"), table.acquire("b")
+    a.pos += MB
+    stolen = table.acquire("c")
+    # b بزرگ‌ترین باقیمانده است؛ نصف دومش جدا می‌شود
+    assert (stolen.start, stolen.end) == (6 * MB, 8 * MB - 1)
+    assert b.end == 6 * MB - 1 and stolen.owner == "c"
+    assert_covers(table, 8 * MB)
+
+
+def test_steal_is_aligned_and_leaves_min_split():
+    align = 300 * 1024
+    table = SegmentTable(10 * MB, 1, align=align)
+    seg = table.acquire("a")
+    seg.pos = 12345
+    stolen = table.acquire("b")
+    assert stolen.start % align == 0
+    assert stolen.start - seg.pos >= MIN_SPLIT_SIZE
+    assert stolen.end - stolen.start + 1 >= MIN_SPLIT_SIZE
+    assert_covers(table, 10 * MB)
+
+
+def test_no_steal_below_twice_min_split():
+    table = SegmentTable(2 * MIN_SPLIT_SIZE, 1)
+    seg = table.acquire("a")
+    seg.pos = 1
+    assert table.acquire("b") is None
+    assert not table.has_spare_work()
+
+
+def test_unowned_segment_is_taken_before_stealing():
+    table = SegmentTable(8 * MB, 4)
+    taken = [table.acquire(i) for i in range(4)]
+    assert len({id(seg) for seg in taken}) == 4
+    table.release(taken[2])
+    assert table.acquire("x") is taken[2]
+
+
+def test_snapshot_round_trip_and_completion():
+    table = SegmentTable(4 * MB, 2)
+    for seg in table.segments:
+        seg.pos = seg.start + 100
+    copy = SegmentTable.from_ranges(4 * MB, table.snapshot())
+    assert copy.snapshot() == table.snapshot()
+    assert copy.remaining() == 4 * MB - 200
+    for seg in copy.segments:
+        seg.pos = seg.end + 1
+    assert copy.is_complete()
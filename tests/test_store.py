@@ -0,0 +1,18 @@
+from engine import Download
+from store import QueueStore
+
+
+def test_queue_reopens_in_batches(tmp_path):
+    path = str(tmp_path / "queue.db")
+    store = QueueStore(path)
+    for i in range(20):
+        store.add(Download(f"http://h/{i}.bin", str(tmp_path)))
+    store.close()
+
+    store = QueueStore(path)
+    batches = list(store.load(batch=7))
+    store.close()
+    assert [len(tasks) for tasks in batches] == [7, 7, 6]
+    tasks = [task for tasks in batches for task in tasks]
+    assert [task.url for task in tasks] == [f"http://h/{i}.bin" for i in range(20)]
+    assert all(task.state == "queued" for task in tasks)
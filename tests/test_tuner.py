@@ -0,0 +1,46 @@
+from tuner import ConnectionTuner
+
+
+def step(tuner, throughput, count):
+    # یک بازه‌ی گرم شدن بعد از هر تغییر اندازه گرفته نمی‌شود
+    assert tuner.decide(throughput, count) == 0
+    delta = tuner.decide(throughput, count)
+    if delta:
+        tuner.changed()
+    return delta
+
+
+def test_ramps_up_faster_while_scaling_is_linear():
+    tuner = ConnectionTuner(16)
+    assert step(tuner, 100, 2) == 1
+    assert step(tuner, 150, 3) == 2
+    assert step(tuner, 250, 5) == 4
+
+
+def test_settles_when_gain_is_small():
+    tuner = ConnectionTuner(16)
+    assert step(tuner, 100, 2) == 1
+    assert step(tuner, 105, 3) == 0
+    # بعد از ثابت شدن دیگر تغییری نمی‌دهد
+    assert step(tuner, 500, 3) == 0
+
+
+def test_sheds_added_connections_on_loss():
+    tuner = ConnectionTuner(16)
+    assert step(tuner, 100, 2) == 1
+    assert step(tuner, 150, 3) == 2
+    assert step(tuner, 120, 5) == -2
+
+
+def test_respects_limit():
+    tuner = ConnectionTuner(4)
+    assert step(tuner, 100, 2) == 1
+    assert step(tuner, 150, 3) == 1
+    assert step(tuner, 200, 4) == 0
+
+
+def test_finished_workers_reset_the_baseline():
+    tuner = ConnectionTuner(16)
+    assert step(tuner, 100, 4) == 1
+    # Workerها کار نداشتند و تمام شدند؛ افت سرعت دلیل بستن اتصال نیست
+    assert step(tuner, 40, 2) == 1
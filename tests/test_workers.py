@@ -0,0 +1,40 @@
+import os
+import time
+
+import pytest
+
+import engine
+from bench import RangeHandler
+from cache import DownloadCache
+
+
+class SlowTailHandler(RangeHandler):
+    # اولین درخواست تکه‌ی دوم دیر جواب می‌گیرد تا Worker اول زودتر تمام کند
+    delayed = False
+
+    def send_file(self, with_body):
+        if with_body and not self.headers.get("Range", "bytes=0-").startswith("bytes=0-") \
+                and not SlowTailHandler.delayed:
+            SlowTailHandler.delayed = True
+            time.sleep(0.5)
+        super().send_file(with_body)
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(engine, "cache", DownloadCache(str(tmp_path / "cache.json")))
+
+
+def test_retired_worker_segment_is_finished(make_server, tmp_path, monkeypatch):
+    # تکه‌ی Worker کنارگذاشته برای دزدیدن کوچک است و بعد از رفتن Worker دیگر رها می‌شود
+    server = make_server(SlowTailHandler)
+    data = os.urandom(5 * 1024 * 1024 // 2)
+    (server.root / "t.bin").write_bytes(data)
+    decisions = iter([-1])
+    monkeypatch.setattr(engine, "PROBE_INTERVAL", 0.05)
+    monkeypatch.setattr(engine.ConnectionTuner, "decide", lambda self, rate, count: next(decisions, 0))
+    task = engine.Download(server.url + "t.bin", str(tmp_path / "out"))
+    task.run_download()
+    assert SlowTailHandler.delayed
+    assert task.completed, task.status_text
+    assert (tmp_path / "out" / "t.bin").read_bytes() == data
@@ -0,0 +1,56 @@
+# تعداد اتصال‌های هر دانلود با سرعت اندازه‌گیری‌شده تنظیم می‌شود (hill climbing با شروع آهسته‌ی TCP)
+PROBE_INTERVAL = 1.0
+# اتصال تازه اول TTFB و slow start دارد؛ این تعداد بازه بعد از هر تغییر اندازه گرفته نمی‌شود
+WARMUP_INTERVALS = 1
+# اتصال‌های اضافه فقط وقتی می‌مانند که سرعت کل دست‌کم این‌قدر بهتر شود
+MIN_GAIN = 0.10
+# اگر سرعت بعد از افزودن این‌قدر کمتر شد، اتصال‌های اضافه ضرر داشته‌اند و بسته می‌شوند
+MAX_LOSS = 0.10
+# تا وقتی هر اتصال تازه دست‌کم این نسبت از سرعت میانگین اتصال‌های قبلی را بیاورد، گام دو برابر می‌شود
+LINEAR_SCALING = 0.8
+
+
+class ConnectionTuner:
+    def __init__(self, limit):
+        self.limit = limit
+        # سرعت و تعداد اتصال قبل از آخرین افزودن
+        self.baseline = None
+        self.baseline_count = 0
+        self.step = 1
+        self.skip = WARMUP_INTERVALS
+        self.settled = False
+
+    def decide(self, throughput, count):
+        # چند اتصال اضافه (مثبت) یا بسته (منفی) شود
+        if self.skip:
+            self.skip -= 1
+            return 0
+        if self.settled:
+            return 0
+        if count < self.baseline_count:
+            # Workerهایی تمام شدند (کار برای همه نماند)؛ مقایسه با قبل معنی ندارد
+            self.baseline = None
+        if self.baseline is not None:
+            if throughput < self.baseline * (1 + MIN_GAIN):
+                # سرعت دیگر بالا نمی‌رود؛ همین تعداد می‌ماند، یا اگر بدتر شد اتصال‌های آخر بسته می‌شوند
+                self.settled = True
+                if throughput < self.baseline * (1 - MAX_LOSS):
+                    return -min(count - 1, count - self.baseline_count)
+                return 0
+            added = count - self.baseline_count
+            per_connection = self.baseline / self.baseline_count
+            if added > 0 and throughput - self.baseline >= added * per_connection * LINEAR_SCALING:
+                self.step *= 2
+            else:
+                self.step = 1
+        self.baseline = throughput
+        self.baseline_count = count
+        return min(self.step, self.limit - count)
+
+    def changed(self):
+        self.skip = WARMUP_INTERVALS
+
+    def rejected(self):
+        # افزودن ممکن نبود (سقف کل اتصال‌ها یا تکه‌ای برای جدا کردن نماند)؛ بعدا دوباره اندازه می‌گیریم
+        self.baseline = None
+        self.step = 1